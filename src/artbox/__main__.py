@@ -1,6 +1,28 @@
 """ArtBox app to be called from `python -m`."""
 
+import os
+import sys
+
 from artbox.cli import app
+from artbox.server import SOCKET_ENV_VAR
+
+
+def main() -> None:
+    """Run the app, or forward the command to an artbox server if set."""
+    socket_path = os.environ.get(SOCKET_ENV_VAR)
+    argv = sys.argv[1:]
+
+    if socket_path and argv[:1] != ["serve"]:
+        from artbox.server import dispatch
+
+        try:
+            sys.exit(dispatch(argv, socket_path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            # the server is not running, run the command locally
+            pass
 
-if __name__ == "__main__":
     app()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""Set of helpers for decoding and encoding audio through ffmpeg."""
+
+from __future__ import annotations
+
+import os
+import threading
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+import ffmpeg
+import numpy as np
+
+from artbox.cache import (
+    evict_lru,
+    file_content_hash,
+    file_stat_key,
+    get_cache_dir,
+    touch,
+)
+
+# Maximum size of the decoded audio cache
+PCM_CACHE_MAX_BYTES = 4 * 1024**3
+# Larger files are keyed by their stat, instead of the hash of the content
+PCM_CACHE_HASH_MAX_BYTES = 64 * 1024**2
+# Number of frames decoded at once when filling the cache
+PCM_CACHE_BLOCK_FRAMES = 1 << 16
+
+
+@dataclass
+class AudioBuffer:
+    """
+    Decoded audio kept in memory.
+
+    Attributes
+    ----------
+    samples : np.ndarray
+        Float32 samples in the range [-1, 1], with shape (n,) for mono or
+        (n, channels).
+    sample_rate : int
+        Sample rate in Hz.
+    """
+
+    samples: np.ndarray
+    sample_rate: int
+
+    @property
+    def channels(self) -> int:
+        """Return the number of channels."""
+        return 1 if self.samples.ndim == 1 else self.samples.shape[1]
+
+    @property
+    def duration(self) -> float:
+        """Return the duration in seconds."""
+        return len(self.samples) / self.sample_rate
+
+    def to_mono(self) -> np.ndarray:
+        """Return the samples averaged into a single channel."""
+        if self.samples.ndim == 1:
+            return self.samples
+        return self.samples.mean(axis=1, dtype=np.float32)
+
+    def to_int16(self) -> np.ndarray:
+        """Return the samples as 16-bit PCM."""
+        return (np.clip(self.samples, -1, 1) * 32767).astype(np.int16)
+
+
+def split_on_silence(
+    samples: np.ndarray,
+    sample_rate: int,
+    max_duration: float,
+    silence_duration: float = 0.3,
+) -> list[tuple[int, int]]:
+    """
+    Split mono audio into chunks no longer than `max_duration`.
+
+    Each cut is placed in the middle of the quietest stretch, measured over
+    windows of `silence_duration` seconds, in the second half of the chunk,
+    so the cuts fall on pauses whenever there are any.
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        Mono samples.
+    sample_rate : int
+        Sample rate in Hz.
+    max_duration : float
+        Maximum duration of a chunk in seconds.
+    silence_duration : float
+        Duration, in seconds, of the window used to find the silences.
+
+    Returns
+    -------
+    list[tuple[int, int]]
+        Start and end sample of each chunk.
+    """
+    n_samples = len(samples)
+    frame_size = max(sample_rate // 100, 1)  # 10ms
+    max_frames = max(int(max_duration * sample_rate) // frame_size, 2)
+    if n_samples <= max_frames * frame_size:
+        return [(0, n_samples)] if n_samples else []
+
+    # energy of each frame, smoothed over the silence window
+    n_frames = n_samples // frame_size
+    frames = samples[: n_frames * frame_size].reshape(n_frames, frame_size)
+    energy = np.square(frames, dtype=np.float32).mean(axis=1)
+    window = max(int(silence_duration * 100), 1)
+    energy = np.convolve(energy, np.ones(window) / window, mode="same")
+
+    spans = []
+    start = 0
+    while n_frames - start > max_frames:
+        search_from = start + max_frames // 2
+        region = energy[search_from : start + max_frames]
+        # cut in the middle of the quietest stretch
+        quiet = region <= region.min() + 1e-10
+        first = int(np.argmax(quiet))
+        length = int(np.argmin(quiet[first:])) or len(region) - first
+        cut = search_from + first + length // 2
+        spans.append((start * frame_size, cut * frame_size))
+        start = cut
+    spans.append((start * frame_size, n_samples))
+    return spans
+
+
+def probe_sample_rate(file_path: str) -> int:
+    """
+    Return the sample rate of the first audio stream of a media file.
+
+    Parameters
+    ----------
+    file_path : str
+        Path of the media file.
+
+    Returns
+    -------
+    int
+        Sample rate in Hz.
+    """
+    probe = ffmpeg.probe(file_path)
+    for stream in probe.get("streams", []):
+        if stream.get("codec_type") == "audio":
+            return int(stream["sample_rate"])
+    raise Exception(f"No audio stream found in `{file_path}`.")
+
+
+def decode_audio(
+    file_path: str, sample_rate: Optional[int] = None, channels: int = 1
+) -> AudioBuffer:
+    """
+    Decode a media file into memory.
+
+    Parameters
+    ----------
+    file_path : str
+        Path of any media file that ffmpeg can decode.
+    sample_rate : int, optional
+        Resample the audio to this rate. By default, the original sample
+        rate is kept.
+    channels : int
+        Number of channels of the decoded audio.
+
+    Returns
+    -------
+    AudioBuffer
+        The decoded audio.
+    """
+    sample_rate = sample_rate or probe_sample_rate(file_path)
+    try:
+        data, _ = (
+            ffmpeg.input(file_path)
+            .output(
+                "pipe:",
+                format="f32le",
+                acodec="pcm_f32le",
+                ac=channels,
+                ar=sample_rate,
+            )
+            .global_args("-nostdin")
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+    except ffmpeg.Error as e:
+        raise Exception(
+            f"ffmpeg could not decode `{file_path}`: "
+            f"{e.stderr.decode(errors='ignore')}"
+        )
+
+    samples = np.frombuffer(data, dtype=np.float32)
+    if channels > 1:
+        samples = samples.reshape(-1, channels)
+    return AudioBuffer(samples, sample_rate)
+
+
+def encode_audio(audio: AudioBuffer, output_path: str) -> None:
+    """Encode audio to a file, the format is given by its extension."""
+    try:
+        (
+            ffmpeg.input(
+                "pipe:",
+                format="f32le",
+                ac=audio.channels,
+                ar=audio.sample_rate,
+            )
+            .output(output_path)
+            .overwrite_output()
+            .global_args("-nostdin")
+            .run(
+                input=np.ascontiguousarray(audio.samples).tobytes(),
+                capture_stdout=True,
+                capture_stderr=True,
+            )
+        )
+    except ffmpeg.Error as e:
+        raise Exception(
+            f"ffmpeg could not encode `{output_path}`: "
+            f"{e.stderr.decode(errors='ignore')}"
+        )
+
+
+def iter_audio_blocks(
+    file_path: str,
+    block_size: int,
+    sample_rate: Optional[int] = None,
+    channels: int = 1,
+) -> Iterator[np.ndarray]:
+    """
+    Decode a media file into float32 blocks of a fixed number of frames.
+
+    The audio is read from an ffmpeg pipe, so the memory used doesn't
+    depend on the duration of the file. The same buffer is reused for every
+    block, so the caller needs to copy the data if it should outlive the
+    next iteration. The last block can be shorter than `block_size`.
+
+    Parameters
+    ----------
+    file_path : str
+        Path of any media file that ffmpeg can decode.
+    block_size : int
+        Number of frames per block.
+    sample_rate : int, optional
+        Resample the audio to this rate. By default, the original sample
+        rate is kept.
+    channels : int
+        Number of channels of the decoded audio.
+
+    Yields
+    ------
+    np.ndarray
+        Block of samples with shape (n,) for mono or (n, channels).
+    """
+    output_args = {"format": "f32le", "acodec": "pcm_f32le", "ac": channels}
+    if sample_rate:
+        output_args["ar"] = sample_rate
+
+    process = (
+        ffmpeg.input(file_path)
+        .output("pipe:", **output_args)
+        .global_args("-nostdin", "-loglevel", "error")
+        .run_async(pipe_stdout=True)
+    )
+
+    shape = (block_size,) if channels == 1 else (block_size, channels)
+    buffer = np.empty(shape, dtype=np.float32)
+    view = buffer.data.cast("B")
+    frame_bytes = buffer.itemsize * channels
+
+    try:
+        while True:
+            n_bytes = 0
+            while n_bytes < len(view):
+                n_read = process.stdout.readinto(view[n_bytes:])
+                if not n_read:
+                    break
+                n_bytes += n_read
+
+            n_frames = n_bytes // frame_bytes
+            if n_frames:
+                yield buffer[:n_frames]
+            if n_bytes < len(view):
+                break
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        returncode = process.wait()
+
+    if returncode != 0:
+        raise Exception(f"ffmpeg could not decode `{file_path}`.")
+
+
+def iter_buffer_blocks(
+    audio: AudioBuffer, block_size: int
+) -> Iterator[np.ndarray]:
+    """
+    Iterate over decoded audio in blocks, as `iter_audio_blocks` does.
+
+    The blocks are views of the samples, so no data is copied (for
+    memory-mapped samples, only the pages of each block are read).
+    """
+    for start in range(0, len(audio.samples), block_size):
+        yield audio.samples[start : start + block_size]
+
+
+def _map_pcm(path: Path, channels: int) -> np.ndarray:
+    """Memory-map a raw float32 PCM file, read-only."""
+    samples: np.ndarray
+    if path.stat().st_size:
+        samples = np.memmap(path, dtype=np.float32, mode="r")
+    else:  # empty files can't be mapped
+        samples = np.zeros(0, dtype=np.float32)
+    if channels > 1:
+        samples = samples.reshape(-1, channels)
+    return samples
+
+
+def _pcm_cache_path(
+    file_path: str,
+    sample_rate: Optional[int],
+    channels: int,
+    cache_dir: Optional[str],
+) -> tuple[Path, int]:
+    """
+    Return the cache entry of a file, and its sample rate.
+
+    The files up to `PCM_CACHE_HASH_MAX_BYTES` are keyed by the hash of
+    their content, so copies of a file share the entry; the larger ones
+    (e.g. videos) by their path, size and modification time, so they
+    aren't read just to compute the key.
+    """
+    sample_rate = sample_rate or probe_sample_rate(file_path)
+    if os.path.getsize(file_path) <= PCM_CACHE_HASH_MAX_BYTES:
+        key = file_content_hash(file_path)
+    else:
+        key = file_stat_key(file_path)
+    directory = get_cache_dir("pcm", cache_dir)
+    return directory / f"{key}-{sample_rate}-{channels}.f32", sample_rate
+
+
+def _decode_into_cache(
+    file_path: str,
+    path: Path,
+    block_size: int,
+    sample_rate: int,
+    channels: int,
+) -> Iterator[np.ndarray]:
+    """
+    Decode a file in blocks, writing them to the cache entry at `path`.
+
+    The blocks are yielded as they are written, so the file is decoded
+    and processed in a single pass. The entry is added to the cache only
+    when all the blocks are consumed.
+    """
+    tmp_path = path.with_name(
+        f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    try:
+        with open(tmp_path, "wb") as f:
+            for block in iter_audio_blocks(
+                file_path, block_size, sample_rate, channels
+            ):
+                f.write(block.data)
+                yield block
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def load_cached_audio(
+    file_path: str,
+    sample_rate: Optional[int] = None,
+    channels: int = 1,
+    *,
+    cache_dir: Optional[str] = None,
+    max_bytes: int = PCM_CACHE_MAX_BYTES,
+) -> AudioBuffer:
+    """
+    Decode a media file through the on-disk cache of decoded audio.
+
+    The audio is stored as raw float32 PCM, in the `pcm` cache directory
+    (see `get_cache_dir`), keyed by the file (see `_pcm_cache_path`), the
+    sample rate and the number of channels. On a miss, the file is
+    decoded block by block into the cache, and the least recently used
+    entries are removed to keep the cache under `max_bytes`. The samples
+    are memory-mapped from the cache, so the memory used doesn't depend on
+    the duration of the audio, and several operations on the same file
+    decode it only once.
+
+    Parameters
+    ----------
+    file_path : str
+        Path of any media file that ffmpeg can decode.
+    sample_rate : int, optional
+        Resample the audio to this rate. By default, the original sample
+        rate is kept.
+    channels : int
+        Number of channels of the decoded audio.
+    cache_dir : str, optional
+        Root directory of the caches.
+    max_bytes : int
+        Maximum size of the cache.
+
+    Returns
+    -------
+    AudioBuffer
+        The decoded audio, with read-only memory-mapped samples.
+    """
+    path, sample_rate = _pcm_cache_path(
+        file_path, sample_rate, channels, cache_dir
+    )
+    try:
+        samples = _map_pcm(path, channels)
+        touch(path)
+    except FileNotFoundError:
+        for _ in _decode_into_cache(
+            file_path, path, PCM_CACHE_BLOCK_FRAMES, sample_rate, channels
+        ):
+            pass
+        # the mapping stays valid even if the entry is evicted
+        samples = _map_pcm(path, channels)
+        evict_lru(path.parent, max_bytes)
+
+    return AudioBuffer(samples, sample_rate)
+
+
+def iter_cached_audio_blocks(
+    file_path: str,
+    block_size: int,
+    sample_rate: Optional[int] = None,
+    channels: int = 1,
+    *,
+    cache_dir: Optional[str] = None,
+    max_bytes: int = PCM_CACHE_MAX_BYTES,
+) -> Iterator[np.ndarray]:
+    """
+    Iterate over the audio of a file in blocks, through the cache.
+
+    On a hit, the blocks are views of the memory-mapped cache entry (see
+    `load_cached_audio`). On a miss, they are decoded by ffmpeg, as in
+    `iter_audio_blocks`, and written to the cache as they are yielded, so
+    the file isn't decoded ahead of the processing.
+    """
+    path, sample_rate = _pcm_cache_path(
+        file_path, sample_rate, channels, cache_dir
+    )
+    try:
+        samples = _map_pcm(path, channels)
+        touch(path)
+    except FileNotFoundError:
+        yield from _decode_into_cache(
+            file_path, path, block_size, sample_rate, channels
+        )
+        evict_lru(path.parent, max_bytes)
+        return
+
+    yield from iter_buffer_blocks(
+        AudioBuffer(samples, sample_rate), block_size
+    )
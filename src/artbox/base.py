@@ -2,15 +2,72 @@
 
 from __future__ import annotations
 
+import glob
+
 from abc import ABC
 from pathlib import Path
+from typing import Any, Iterator
 
 
 class ArtBox(ABC):
     """The base class for all ArtBox classes."""
 
-    def __init__(self, args: dict[str, str]) -> None:
+    def __init__(self, args: dict[str, Any]) -> None:
         """Initialize ArtBox class."""
-        self.args: dict[str, str] = args
+        self.args: dict[str, Any] = args
         self.input_path = Path(self.args.get("input-path", "/tmp"))
         self.output_path = Path(self.args.get("output-path", "/tmp"))
+
+
+def is_batch_input(input_path: str) -> bool:
+    """Check if the input path is a directory or a glob pattern."""
+    return Path(input_path).is_dir() or any(c in input_path for c in "*?[")
+
+
+def iter_input_paths(input_path: str) -> Iterator[Path]:
+    """
+    Iterate over the files given by a directory or a glob pattern.
+
+    Parameters
+    ----------
+    input_path : str
+        A directory, which is walked recursively, or a glob pattern (`**`
+        is supported). A regular file path yields just that file.
+
+    Yields
+    ------
+    Path
+        Path of each file found, in sorted order.
+    """
+    path = Path(input_path)
+    if path.is_dir():
+        paths = path.rglob("*")
+    else:
+        paths = (Path(p) for p in glob.iglob(input_path, recursive=True))
+
+    yield from sorted(p for p in paths if p.is_file())
+
+
+def iter_batch_paths(
+    input_path: str, output_dir: Path, suffix: str
+) -> Iterator[tuple[Path, Path]]:
+    """
+    Iterate over the input files of a batch and their output paths.
+
+    The output files are placed in `output_dir`, with the same name as the
+    input files (and relative path, for a directory) but with the given
+    suffix. Their parent directories are created.
+
+    Yields
+    ------
+    tuple[Path, Path]
+        Path of each input file and of its output file.
+    """
+    input_dir = Path(input_path) if Path(input_path).is_dir() else None
+    for path in iter_input_paths(input_path):
+        relative_path = (
+            path.relative_to(input_dir) if input_dir else Path(path.name)
+        )
+        output_path = output_dir / relative_path.with_suffix(suffix)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        yield path, output_path
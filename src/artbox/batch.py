@@ -0,0 +1,149 @@
+"""Run many ArtBox operations from a manifest file, in parallel."""
+
+from __future__ import annotations
+
+import importlib
+import json
+import os
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any
+
+from artbox.base import ArtBox
+
+# operation name (as in the cli) -> (module, class, method)
+OPERATIONS: dict[str, tuple[str, str, str]] = {
+    "sound notes-to-audio": ("artbox.sounds", "Sound", "notes_to_audio"),
+    "sound spectrogram": ("artbox.sounds", "Sound", "spectrogram"),
+    "sound extract-notes": (
+        "artbox.sounds",
+        "Sound",
+        "extract_notes_from_mp3",
+    ),
+    "sound convert-to-8bit": (
+        "artbox.sounds",
+        "Sound",
+        "convert_to_8bit_audio",
+    ),
+    "speech from-text": ("artbox.speech", "SpeechFromText", "convert"),
+    "speech to-text": ("artbox.speech", "SpeechToText", "convert"),
+    "video remove-audio": ("artbox.videos", "Video", "remove_audio"),
+    "video extract-audio": ("artbox.videos", "Video", "extract_audio"),
+    "video get-metadata": ("artbox.videos", "Video", "get_metadata"),
+    "video combine-video-and-audio": (
+        "artbox.videos",
+        "Video",
+        "combine_video_and_audio",
+    ),
+    "youtube download": ("artbox.videos", "Youtube", "download"),
+    "youtube cc": ("artbox.videos", "Youtube", "download_captions"),
+}
+
+
+def load_manifest(manifest_path: str) -> list[dict[str, Any]]:
+    """
+    Load the tasks of a manifest file.
+
+    The manifest is a JSON Lines file (one task per line) or, if PyYAML is
+    installed, a YAML file (`.yaml` or `.yml`) with a list of tasks. Each
+    task has the keys `operation` (e.g. "sound spectrogram"), `args` (the
+    same arguments used by the cli, e.g. `input-path`) and, optionally,
+    `id`.
+    """
+    path = Path(manifest_path)
+
+    if path.suffix.lower() in {".yaml", ".yml"}:
+        try:
+            import yaml
+        except ImportError:
+            raise Exception(
+                "PyYAML is required for YAML manifests, "
+                "install it with `pip install pyyaml`."
+            )
+        with open(path, "r") as f:
+            return list(yaml.safe_load(f) or [])
+
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_task(task: dict[str, Any]) -> dict[str, Any]:
+    """
+    Run a single task of a manifest.
+
+    Returns
+    -------
+    dict[str, Any]
+        The status of the task (`ok` or `error`), its duration in seconds
+        and the error message, if any.
+    """
+    operation = task.get("operation", "")
+    result: dict[str, Any] = {"id": task.get("id"), "operation": operation}
+    start = time.perf_counter()
+
+    try:
+        if operation not in OPERATIONS:
+            raise Exception(f"Operation `{operation}` not found.")
+
+        module_name, class_name, method_name = OPERATIONS[operation]
+        cls = getattr(importlib.import_module(module_name), class_name)
+        getattr(cls(task.get("args", {})), method_name)()
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e) or type(e).__name__
+        result["traceback"] = traceback.format_exc()
+    else:
+        result["status"] = "ok"
+
+    result["duration"] = round(time.perf_counter() - start, 6)
+    return result
+
+
+class Batch(ArtBox):
+    """Run the operations of a manifest file in a pool of processes."""
+
+    def run(self) -> dict[str, int]:
+        """
+        Run all the tasks of the manifest given by `input-path`.
+
+        The tasks run in a pool of `workers` processes (by default, the
+        number of CPU cores). The result of each task is written to
+        `output-path` (JSON Lines) as soon as it finishes, with its index in
+        the manifest, status, duration and error.
+
+        Returns
+        -------
+        dict[str, int]
+            Number of tasks by status.
+        """
+        tasks = load_manifest(str(self.input_path))
+        workers = int(self.args.get("workers") or 0) or os.cpu_count() or 1
+
+        summary = {"ok": 0, "error": 0}
+        with (
+            ProcessPoolExecutor(max_workers=workers) as executor,
+            open(self.output_path, "w") as f,
+        ):
+            futures = {
+                executor.submit(run_task, task): index
+                for index, task in enumerate(tasks)
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # e.g. the worker process died
+                    result = {"status": "error", "error": str(e)}
+                result = {"index": futures[future], **result}
+                summary[result["status"]] += 1
+                f.write(json.dumps(result) + "\n")
+                f.flush()
+
+        print(
+            f"{summary['ok']} tasks succeeded and {summary['error']} failed. "
+            f"Results saved at '{self.output_path}'."
+        )
+        return summary
@@ -0,0 +1,130 @@
+"""Set of helpers for the on-disk caches used by ArtBox."""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import shutil
+import threading
+
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "artbox"
+
+
+def get_cache_dir(namespace: str, cache_dir: Optional[str] = None) -> Path:
+    """
+    Return the cache directory for the given namespace, creating it.
+
+    Parameters
+    ----------
+    namespace : str
+        Name of the subdirectory used by a specific cache (e.g. "metadata").
+    cache_dir : str, optional
+        Root directory of the caches. If not given, the environment variable
+        `ARTBOX_CACHE_DIR` is used, falling back to `~/.cache/artbox`.
+
+    Returns
+    -------
+    Path
+        The cache directory.
+    """
+    root = cache_dir or os.environ.get("ARTBOX_CACHE_DIR") or DEFAULT_CACHE_DIR
+    path = Path(root) / namespace
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def file_stat_key(file_path: str) -> str:
+    """
+    Return a key that identifies the current version of a file.
+
+    The key is a hash of the resolved path, the size and the modification
+    time of the file, so it changes whenever the file is modified.
+    """
+    path = Path(file_path).resolve()
+    stat = path.stat()
+    key = f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write a file atomically, so concurrent readers never see it partial."""
+    tmp_path = path.with_name(
+        f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def touch(path: Path) -> None:
+    """Mark a cache entry as recently used (for `evict_lru`)."""
+    os.utime(path)
+
+
+def evict_lru(cache_dir: Path, max_bytes: int) -> None:
+    """
+    Remove the least recently used files until the cache fits `max_bytes`.
+
+    The files are ordered by modification time, so the entries need to be
+    touched (see `touch`) when they are used.
+    """
+    entries = []
+    for path in cache_dir.iterdir():
+        if path.name.startswith(".") or not path.is_file():
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:  # removed by another process
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def link_or_copy(source: Path, target: Path) -> None:
+    """
+    Place `source` at `target`, as a hard link when possible.
+
+    It falls back to a copy when the files are on different devices (or
+    the file system doesn't support hard links). The target is replaced
+    atomically.
+    """
+    tmp_path = target.with_name(
+        f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+@functools.lru_cache(maxsize=1024)
+def _content_hash(path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_content_hash(file_path: str) -> str:
+    """
+    Return the sha256 hash of the content of a file.
+
+    Unlike `file_stat_key`, the hash doesn't change when the file is copied
+    or renamed. It is memoized by path, size and modification time, so each
+    version of a file is read only once per process.
+    """
+    path = Path(file_path).resolve()
+    stat = path.stat()
+    return _content_hash(str(path), stat.st_size, stat.st_mtime_ns)
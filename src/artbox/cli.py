@@ -1,13 +1,18 @@
-"""Cli functions to define the arguments and to call Makim."""
+"""
+Cli functions to define the arguments and to call Makim.
+
+The modules with the commands' implementation are imported by each
+command, so the heavy dependencies (librosa, moviepy, etc) are loaded only
+by the commands that use them.
+"""
 
 import typer
 
 from typing_extensions import Annotated
 
 from artbox import __version__
-from artbox.sounds import Sound
-from artbox.speech import SpeechFromText, SpeechToText
-from artbox.videos import Video, Youtube
+from artbox.base import is_batch_input
+from artbox.server import DEFAULT_SOCKET_PATH, SOCKET_ENV_VAR
 
 app = typer.Typer(
     name="Artbox",
@@ -66,6 +71,70 @@ def main(
         raise typer.Exit(0)
 
 
+@app.command("batch")
+def batch(
+    manifest_path: Annotated[
+        str,
+        typer.Option(
+            "--manifest-path",
+            help=(
+                "Specify the path of the manifest file (jsonl or yaml) with "
+                "the operations to run"
+            ),
+        ),
+    ] = "",
+    results_path: Annotated[
+        str,
+        typer.Option(
+            "--results-path",
+            help="Specify the path to store the results file (jsonl)",
+        ),
+    ] = "",
+    workers: Annotated[
+        int,
+        typer.Option(
+            "--workers",
+            help="Number of parallel processes (0 for the number of CPUs)",
+        ),
+    ] = 0,
+) -> None:
+    """Run many operations from a manifest file in parallel."""
+    args_dict = {
+        "input-path": manifest_path,
+        "output-path": results_path,
+        "workers": workers,
+    }
+
+    from artbox.batch import Batch
+
+    runner = Batch(args_dict)
+    summary = runner.run()
+    if summary["error"]:
+        raise typer.Exit(1)
+
+
+@app.command("serve")
+def serve(
+    socket_path: Annotated[
+        str,
+        typer.Option(
+            "--socket-path",
+            envvar=SOCKET_ENV_VAR,
+            help="Specify the path of the Unix socket",
+        ),
+    ] = DEFAULT_SOCKET_PATH,
+) -> None:
+    """
+    Run a server that executes commands with warm dependencies.
+
+    Set the environment variable ARTBOX_SOCKET to the socket path to send
+    the artbox commands to the server.
+    """
+    from artbox.server import serve as run_server
+
+    run_server(socket_path)
+
+
 @app_speech.command("from-text")
 def speech_from_text(
     title: Annotated[
@@ -74,13 +143,21 @@ def speech_from_text(
     input_path: Annotated[
         str,
         typer.Option(
-            "--input-path", help="Specify the path of the text file (txt)"
+            "--input-path",
+            help=(
+                "Specify the path of the text file (txt), or a directory or "
+                "glob pattern to convert many files"
+            ),
         ),
     ] = "",
     output_path: Annotated[
         str,
         typer.Option(
-            "--output-path", help="Specify the path to store the audio file"
+            "--output-path",
+            help=(
+                "Specify the path to store the audio file, or the directory "
+                "for many files"
+            ),
         ),
     ] = "",
     engine: Annotated[
@@ -108,6 +185,69 @@ def speech_from_text(
         str,
         typer.Option("--pitch", help="Decrease/Increase the pitch level"),
     ] = "+0Hz",
+    concurrency: Annotated[
+        int,
+        typer.Option(
+            "--concurrency",
+            help=(
+                "Number of files synthesized at the same time by edge-tts, "
+                "when converting many files (default: 8)"
+            ),
+        ),
+    ] = 0,
+    voice: Annotated[
+        str,
+        typer.Option(
+            "--voice",
+            help=(
+                "Name of the edge-tts voice, e.g. en-US-AriaNeural "
+                "(default: a random voice for the language)"
+            ),
+        ),
+    ] = "",
+    chunk_size: Annotated[
+        int,
+        typer.Option(
+            "--chunk-size",
+            help=(
+                "Split long texts at sentences into chunks of at most this "
+                "many characters, synthesized in parallel (0 disables it)"
+            ),
+        ),
+    ] = 0,
+    retries: Annotated[
+        int,
+        typer.Option(
+            "--retries",
+            help="Number of retries of a chunk after a transient error",
+        ),
+    ] = 3,
+    timings: Annotated[
+        str,
+        typer.Option(
+            "--timings",
+            help=(
+                "Save the timing of the words next to the audio file, as "
+                "subtitles or JSON (Options: srt, json; edge-tts only)"
+            ),
+        ),
+    ] = "",
+    cache_dir: Annotated[
+        str,
+        typer.Option(
+            "--cache-dir",
+            help=(
+                "Specify the cache directory "
+                "(default: $ARTBOX_CACHE_DIR or ~/.cache/artbox)"
+            ),
+        ),
+    ] = "",
+    no_cache: Annotated[
+        bool,
+        typer.Option(
+            "--no-cache", help="Always synthesize the text, ignoring the cache"
+        ),
+    ] = False,
 ) -> None:
     """Convert text to speech."""
     args_dict = {
@@ -119,10 +259,22 @@ def speech_from_text(
         "rate": rate,
         "volume": volume,
         "pitch": pitch,
+        "concurrency": concurrency,
+        "voice": voice,
+        "chunk-size": chunk_size,
+        "retries": retries,
+        "timings": timings,
+        "cache-dir": cache_dir,
+        "no-cache": no_cache,
     }
 
+    from artbox.speech import SpeechFromText
+
     runner = SpeechFromText(args_dict)
-    runner.convert()
+    if is_batch_input(input_path):
+        runner.convert_batch()
+    else:
+        runner.convert()
 
 
 @app_speech.command("to-text")
@@ -131,7 +283,10 @@ def speech_to_text(
         str,
         typer.Option(
             "--input-path",
-            help="Specify the path of the audio file (mp3 or wav)",
+            help=(
+                "Specify the path of the audio file "
+                "(any format supported by ffmpeg)"
+            ),
         ),
     ] = "",
     output_path: Annotated[
@@ -144,15 +299,51 @@ def speech_to_text(
         str,
         typer.Option(
             "--engine",
-            help="Choose the text-to-speech engine (Options: google)",
+            help=(
+                "Choose the speech-to-text engine (Options: google, "
+                "google_cloud, wit, azure, houndify, ibm, vosk, whisper, "
+                "whisper-api)"
+            ),
         ),
     ] = "google",
+    model: Annotated[
+        str,
+        typer.Option(
+            "--model",
+            help=(
+                "Model of the local engines: the whisper model name "
+                "(default: base) or the path of the vosk model"
+            ),
+        ),
+    ] = "",
     lang: Annotated[
         str,
         typer.Option(
             "--lang", help="Choose the language for audio generation"
         ),
     ] = "en",
+    chunk_duration: Annotated[
+        float,
+        typer.Option(
+            "--chunk-duration",
+            help=(
+                "Split long audios at silences into chunks of at most this "
+                "many seconds, recognized in parallel (0 disables it). "
+                "Use an output path ending in .srt or .json to save the "
+                "timestamps"
+            ),
+        ),
+    ] = 0,
+    workers: Annotated[
+        int,
+        typer.Option(
+            "--workers",
+            help=(
+                "Number of chunks recognized in parallel "
+                "(default: number of CPU cores)"
+            ),
+        ),
+    ] = 0,
 ) -> None:
     """Convert text to speech."""
     args_dict = {
@@ -160,8 +351,13 @@ def speech_to_text(
         "output-path": output_path,
         "engine": engine,
         "lang": lang,
+        "model": model,
+        "chunk-duration": chunk_duration,
+        "workers": workers,
     }
 
+    from artbox.speech import SpeechToText
+
     runner = SpeechToText(args_dict)
     runner.convert()
 
@@ -192,6 +388,8 @@ def sound_notes_to_audio(
         "duration": duration,
     }
 
+    from artbox.sounds import Sound
+
     runner = Sound(args_dict)
     runner.notes_to_audio()
 
@@ -201,24 +399,143 @@ def sound_spectrogram(
     input_path: Annotated[
         str,
         typer.Option(
-            "--input-path", help="Specify the path of the input file"
+            "--input-path",
+            help=(
+                "Specify the path of the input file, or a directory or glob "
+                "pattern to process many files"
+            ),
         ),
     ] = "",
     output_path: Annotated[
         str,
         typer.Option(
-            "--output-path", help="Specify the path to store the audio file"
+            "--output-path",
+            help=(
+                "Specify the path to store the image file, or the directory "
+                "for many files"
+            ),
+        ),
+    ] = "",
+    plain: Annotated[
+        bool,
+        typer.Option(
+            "--plain",
+            help="Save only the spectrogram, without axes and colorbar",
+        ),
+    ] = False,
+    workers: Annotated[
+        int,
+        typer.Option(
+            "--workers",
+            help="Number of parallel processes (0 for the number of CPUs)",
+        ),
+    ] = 0,
+    n_fft: Annotated[
+        int, typer.Option("--n-fft", help="Length of the FFT window")
+    ] = 2048,
+    hop_length: Annotated[
+        int,
+        typer.Option("--hop-length", help="Number of samples between frames"),
+    ] = 512,
+    n_mels: Annotated[
+        int, typer.Option("--n-mels", help="Number of mel bands")
+    ] = 128,
+    fmax: Annotated[
+        float,
+        typer.Option("--fmax", help="Highest frequency of the mel bands"),
+    ] = 8000,
+    features_path: Annotated[
+        str,
+        typer.Option(
+            "--features-path",
+            help=(
+                "Save the raw features as .npy (or .npz) arrays at this "
+                "path, or in this directory for many files"
+            ),
         ),
     ] = "",
+    features: Annotated[
+        str,
+        typer.Option(
+            "--features",
+            help=(
+                "Comma separated features to save "
+                "(Options: mel, linear, chroma, mfcc)"
+            ),
+        ),
+    ] = "mel",
+    dtype: Annotated[
+        str,
+        typer.Option(
+            "--dtype",
+            help="Type of the saved features (Options: float32, float16)",
+        ),
+    ] = "float32",
+    stream: Annotated[
+        bool,
+        typer.Option(
+            "--stream",
+            help=(
+                "Process the audio in blocks, with bounded memory, for very "
+                "long files (only the mel feature can be saved, as .npy)"
+            ),
+        ),
+    ] = False,
+    max_frames: Annotated[
+        int,
+        typer.Option(
+            "--max-frames",
+            help=(
+                "Downsample the image in time to at most this many frames "
+                "(default: no limit, or 4096 with --stream)"
+            ),
+        ),
+    ] = 0,
+    cache_dir: Annotated[
+        str,
+        typer.Option(
+            "--cache-dir",
+            help=(
+                "Specify the cache directory "
+                "(default: $ARTBOX_CACHE_DIR or ~/.cache/artbox; for many "
+                "files, the cache is only used if this is given)"
+            ),
+        ),
+    ] = "",
+    no_cache: Annotated[
+        bool,
+        typer.Option(
+            "--no-cache",
+            help="Always decode the input file, ignoring the cache",
+        ),
+    ] = False,
 ) -> None:
     """Generate a spectrogram from an MP3 file and saves it as an image."""
     args_dict = {
         "input-path": input_path,
         "output-path": output_path,
+        "plain": plain,
+        "workers": workers,
+        "n-fft": n_fft,
+        "hop-length": hop_length,
+        "n-mels": n_mels,
+        "fmax": fmax,
+        "features-path": features_path,
+        "features": features,
+        "dtype": dtype,
+        "stream": stream,
+        "max-frames": max_frames,
+        "cache-dir": cache_dir,
+        "no-cache": no_cache,
     }
 
+    from artbox.sounds import Sound
+
     runner = Sound(args_dict)
-    runner.spectrogram()
+    if is_batch_input(input_path):
+        runner.spectrogram_batch()
+    else:
+        runner.spectrogram()
 
 
 @app_video.command("remove-audio")
@@ -235,13 +552,26 @@ def video_remove_audio(
             "--output-path", help="Specify the path to store the video file"
         ),
     ] = "",
+    codec: Annotated[
+        str,
+        typer.Option(
+            "--codec",
+            help=(
+                "Re-encode the video with the given codec (e.g. libx264), "
+                "by default the video stream is copied"
+            ),
+        ),
+    ] = "",
 ) -> None:
     """Remove audio from video file."""
     args_dict = {
         "input-path": input_path,
         "output-path": output_path,
+        "codec": codec,
     }
 
+    from artbox.videos import Video
+
     runner = Video(args_dict)
     runner.remove_audio()
 
@@ -261,13 +591,31 @@ def video_extract_audio(
             help="Specify the path to store the extracted audio file",
         ),
     ] = "",
+    bitrate: Annotated[
+        str,
+        typer.Option(
+            "--bitrate",
+            help="Set the audio bitrate (e.g. 192k), it forces transcoding",
+        ),
+    ] = "",
+    sample_rate: Annotated[
+        str,
+        typer.Option(
+            "--sample-rate",
+            help="Set the audio sample rate, it forces transcoding",
+        ),
+    ] = "",
 ) -> None:
     """Extract audio from video file."""
     args_dict = {
         "input-path": input_path,
         "output-path": output_path,
+        "bitrate": bitrate,
+        "sample-rate": sample_rate,
     }
 
+    from artbox.videos import Video
+
     runner = Video(args_dict)
     runner.extract_audio()
 
@@ -277,25 +625,61 @@ def video_get_metadata(
     input_path: Annotated[
         str,
         typer.Option(
-            "--input-path", help="Specify the path of the input video file"
+            "--input-path",
+            help=(
+                "Specify the path of the input video file, or a directory "
+                "or glob pattern to process many files"
+            ),
         ),
     ] = "",
     output_path: Annotated[
         str,
         typer.Option(
             "--output-path",
-            help="Specify the path to store the extracted audio file",
+            help=(
+                "Specify the path to store the metadata file (json, or "
+                "json lines for many files)"
+            ),
+        ),
+    ] = "",
+    cache_dir: Annotated[
+        str,
+        typer.Option(
+            "--cache-dir",
+            help=(
+                "Specify the cache directory "
+                "(default: $ARTBOX_CACHE_DIR or ~/.cache/artbox)"
+            ),
         ),
     ] = "",
+    no_cache: Annotated[
+        bool,
+        typer.Option("--no-cache", help="Always probe the input file"),
+    ] = False,
+    workers: Annotated[
+        int,
+        typer.Option(
+            "--workers",
+            help="Number of files probed concurrently (0 for automatic)",
+        ),
+    ] = 0,
 ) -> None:
     """Get the metadata from a video (mp4)."""
     args_dict = {
         "input-path": input_path,
         "output-path": output_path,
+        "cache-dir": cache_dir,
+        "no-cache": no_cache,
+        "workers": workers,
     }
 
+    from artbox.videos import Video
+
     runner = Video(args_dict)
-    runner.get_metadata()
+    if is_batch_input(input_path):
+        runner.get_metadata_batch()
+    else:
+        runner.get_metadata()
 
 
 @app_video.command("combine-video-and-audio")
@@ -319,14 +703,24 @@ def video_combine_audio_and_video(
             help="Specify the path to store the combined video file",
         ),
     ] = "",
+    reencode: Annotated[
+        bool,
+        typer.Option(
+            "--reencode",
+            help="Re-encode the video instead of copying its stream",
+        ),
+    ] = False,
 ) -> None:
     """Combine audio and video files."""
     args_dict = {
         "video-path": video_path,
         "audio-path": audio_path,
         "output-path": output_path,
+        "reencode": reencode,
     }
 
+    from artbox.videos import Video
+
     runner = Video(args_dict)
     runner.combine_video_and_audio()
 
@@ -360,6 +754,8 @@ def youtube_download(
         "resolution": resolution,
     }
 
+    from artbox.videos import Youtube
+
     runner = Youtube(args_dict)
     runner.download()
 
@@ -399,5 +795,7 @@ def youtube_cc(
         "format": format,
     }
 
+    from artbox.videos import Youtube
+
     runner = Youtube(args_dict)
     runner.download_captions()
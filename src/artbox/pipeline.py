@@ -0,0 +1,136 @@
+"""
+Pipelines of operations that exchange decoded audio in memory.
+
+A pipeline is a DAG of stages. Each stage is a callable that receives the
+outputs of the stages it depends on. The stages created by the functions of
+this module are built on the `Video`, `Sound` and `Speech` classes, and they
+pass `AudioBuffer` objects between them, so the audio is decoded once and
+only the final stages write files. For example:
+
+    pipeline = Pipeline()
+    pipeline.add("audio", extract_audio("video.mp4", sample_rate=16000))
+    pipeline.add("image", spectrogram("spectrogram.png"), inputs=["audio"])
+    pipeline.add("text", speech_to_text("text.txt"), inputs=["audio"])
+    pipeline.run()
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from graphlib import TopologicalSorter
+from typing import Any, Callable, Optional, Sequence
+
+from artbox.audio import AudioBuffer, decode_audio, encode_audio
+
+
+@dataclass
+class Stage:
+    """A stage of a pipeline."""
+
+    func: Callable[..., Any]
+    inputs: list[str] = field(default_factory=list)
+
+
+class Pipeline:
+    """A DAG of stages that pass their outputs in memory."""
+
+    def __init__(self) -> None:
+        """Initialize an empty pipeline."""
+        self.stages: dict[str, Stage] = {}
+
+    def add(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        inputs: Sequence[str] = (),
+    ) -> Pipeline:
+        """
+        Add a stage to the pipeline.
+
+        Parameters
+        ----------
+        name : str
+            Unique name of the stage.
+        func : Callable
+            Function called with the outputs of the `inputs` stages, in the
+            same order.
+        inputs : Sequence[str]
+            Names of the stages whose outputs are used by this stage.
+
+        Returns
+        -------
+        Pipeline
+            The pipeline itself, so calls can be chained.
+        """
+        if name in self.stages:
+            raise Exception(f"Stage `{name}` already exists.")
+        self.stages[name] = Stage(func, list(inputs))
+        return self
+
+    def run(self) -> dict[str, Any]:
+        """
+        Run all the stages, in an order that respects their dependencies.
+
+        Returns
+        -------
+        dict[str, Any]
+            The output of each stage.
+        """
+        for name, stage in self.stages.items():
+            for input_name in stage.inputs:
+                if input_name not in self.stages:
+                    raise Exception(
+                        f"Stage `{name}` depends on the unknown stage "
+                        f"`{input_name}`."
+                    )
+
+        graph = {name: stage.inputs for name, stage in self.stages.items()}
+        outputs: dict[str, Any] = {}
+        for name in TopologicalSorter(graph).static_order():
+            stage = self.stages[name]
+            outputs[name] = stage.func(
+                *(outputs[input_name] for input_name in stage.inputs)
+            )
+        return outputs
+
+
+def load_audio(
+    file_path: str, sample_rate: Optional[int] = None, channels: int = 1
+) -> Callable[[], AudioBuffer]:
+    """Create a stage that decodes an audio (or video) file."""
+    return lambda: decode_audio(file_path, sample_rate, channels)
+
+
+def extract_audio(
+    video_path: str, sample_rate: Optional[int] = None, channels: int = 1
+) -> Callable[[], AudioBuffer]:
+    """Create a stage that decodes the audio of a video file."""
+    from artbox.videos import Video
+
+    video = Video({"input-path": video_path})
+    return lambda: video.extract_audio_buffer(sample_rate, channels)
+
+
+def spectrogram(output_path: str) -> Callable[[AudioBuffer], None]:
+    """Create a stage that saves the spectrogram of its input audio."""
+    from artbox.sounds import Sound
+
+    sound = Sound({"output-path": output_path})
+    return sound.spectrogram
+
+
+def speech_to_text(
+    output_path: str, engine: str = "google", lang: str = "en-US"
+) -> Callable[[AudioBuffer], None]:
+    """Create a stage that saves the speech of its input audio as text."""
+    from artbox.speech import SpeechToText
+
+    speech = SpeechToText(
+        {"output-path": output_path, "engine": engine, "lang": lang}
+    )
+    return speech.convert_from_audio
+
+
+def save_audio(output_path: str) -> Callable[[AudioBuffer], None]:
+    """Create a stage that encodes its input audio to a file."""
+    return lambda audio: encode_audio(audio, output_path)
@@ -0,0 +1,189 @@
+"""
+Persistent worker mode for the ArtBox CLI.
+
+`artbox serve` starts a process that imports and warms up the heavy
+dependencies once, and then listens on a Unix socket. When the environment
+variable `ARTBOX_SOCKET` is set, `artbox` works as a thin client: it sends
+its arguments to the server, which runs the command in a forked child
+process (so each command starts with the warm modules), with the working
+directory and environment variables of the client, and streams the output
+back.
+
+The protocol is line-based JSON: the client sends
+`{"argv": [...], "cwd": "...", "env": {...}}` and the server answers with
+`{"stream": "stdout" | "stderr", "data": "..."}` messages, followed by a
+final `{"exit_code": 0}`.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+
+from contextlib import redirect_stderr, redirect_stdout
+
+DEFAULT_SOCKET_PATH = "/tmp/artbox.sock"
+SOCKET_ENV_VAR = "ARTBOX_SOCKET"
+
+
+def warm_up() -> None:
+    """Import the heavy dependencies and initialize their caches."""
+    import asyncio
+
+    import librosa.display  # noqa: F401
+    import matplotlib.backends.backend_agg  # noqa: F401
+    import moviepy.editor  # noqa: F401
+    import noisereduce as nr
+    import numpy as np
+
+    import artbox.sounds
+    import artbox.speech
+    import artbox.videos
+
+    # run the numerical code paths once, so lazy initializations and JIT
+    # compilations are done before forking the workers
+    y = np.zeros(artbox.sounds.EIGHT_BIT_SAMPLE_RATE, dtype=np.float32)
+    artbox.sounds.mel_spectrogram_db(y, artbox.sounds.SPECTROGRAM_SAMPLE_RATE)
+    nr.reduce_noise(y=y, sr=22050, y_noise=y, stationary=True)
+
+    try:
+        asyncio.run(artbox.speech.get_voices_manager())
+    except Exception as e:
+        print(f"Warning: edge-tts voices not loaded: {e}", file=sys.stderr)
+
+
+def run_command(argv: list[str]) -> int:
+    """
+    Run an artbox command in the current process.
+
+    Parameters
+    ----------
+    argv : list[str]
+        Command line arguments, without the program name.
+
+    Returns
+    -------
+    int
+        The exit code of the command.
+    """
+    from artbox.cli import app
+
+    try:
+        app(args=argv, prog_name="artbox")
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+class _MessageWriter(io.TextIOBase):
+    """Text stream that sends everything written as protocol messages."""
+
+    encoding = "utf-8"
+    errors = "strict"
+
+    def __init__(self, wfile: io.BufferedIOBase, name: str) -> None:
+        self.wfile = wfile
+        self.name = name
+
+    def write(self, data: str) -> int:
+        # click probes for binary streams writing b"", it should fail here
+        if not isinstance(data, str):
+            raise TypeError("write() argument must be str")
+        if data:
+            message = {"stream": self.name, "data": data}
+            self.wfile.write(json.dumps(message).encode() + b"\n")
+            self.wfile.flush()
+        return len(data)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Run the requested command, it is called in a forked process."""
+
+    def handle(self) -> None:
+        request = json.loads(self.rfile.readline())
+        os.chdir(request["cwd"])
+        if "env" in request:
+            # e.g. ARTBOX_CACHE_DIR and the credentials of the engines
+            os.environ.clear()
+            os.environ.update(request["env"])
+
+        stdout = _MessageWriter(self.wfile, "stdout")
+        stderr = _MessageWriter(self.wfile, "stderr")
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            exit_code = run_command(request["argv"])
+
+        self.wfile.write(json.dumps({"exit_code": exit_code}).encode())
+        self.wfile.write(b"\n")
+
+
+class ArtBoxServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server that runs each request in a forked process."""
+
+
+def serve(socket_path: str = DEFAULT_SOCKET_PATH) -> None:
+    """Warm up the dependencies and serve commands until interrupted."""
+    warm_up()
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    # stop gracefully (removing the socket) on `kill`
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+
+    with ArtBoxServer(socket_path, _RequestHandler) as server:
+        os.chmod(socket_path, 0o600)
+        print(f"ArtBox server listening on '{socket_path}'.", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+
+def dispatch(argv: list[str], socket_path: str) -> int:
+    """
+    Run a command on an artbox server, printing its output.
+
+    Parameters
+    ----------
+    argv : list[str]
+        Command line arguments, without the program name.
+    socket_path : str
+        Path of the server socket.
+
+    Returns
+    -------
+    int
+        The exit code of the command.
+    """
+    request = {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+
+        with sock.makefile("rb") as f:
+            for line in f:
+                message = json.loads(line)
+                if "exit_code" in message:
+                    return int(message["exit_code"])
+                stream = sys.stdout
+                if message["stream"] == "stderr":
+                    stream = sys.stderr
+                stream.write(message["data"])
+                stream.flush()
+
+    raise Exception("The artbox server closed the connection.")
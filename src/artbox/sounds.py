@@ -1,21 +1,39 @@
-"""A set of methods and classes for handing and creating sounds."""
+"""
+A set of methods and classes for handing and creating sounds.
 
+aubio, librosa, matplotlib and noisereduce are slow to import, so they are
+imported only by the methods that use them.
+"""
+
+import functools
 import json
+import math
+import os
+import re
+import struct
+import tempfile
 
-from math import log2
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator, Optional, Union
 
-import aubio
-import librosa
-import librosa.display
-import matplotlib.pyplot as plt
-import noisereduce as nr
+import ffmpeg
 import numpy as np
+import numpy.typing as npt
 
-from moviepy.editor import VideoFileClip
 from pydub import AudioSegment
-from pydub.generators import Sine
 
-from artbox.base import ArtBox
+from artbox.audio import (
+    AudioBuffer,
+    decode_audio,
+    iter_audio_blocks,
+    iter_buffer_blocks,
+    iter_cached_audio_blocks,
+    load_cached_audio,
+    probe_sample_rate,
+)
+from artbox.base import ArtBox, iter_batch_paths
 
 NOTES_FREQ = {
     "A": 440,
@@ -124,30 +142,581 @@ NOTES_FREQ = {
     "C8": 4186.01,
 }
 
+# notes with octave (C0 ... C8), ordered by pitch, shared with NOTES_FREQ.
+# The index of a note in this table is its code.
+NOTE_LABELS = tuple(
+    sorted(
+        (note for note in NOTES_FREQ if note[-1].isdigit()),
+        key=NOTES_FREQ.__getitem__,
+    )
+)
+_NOTE_LABELS_ARRAY = np.array(NOTE_LABELS)
+# code of the reference note A4 (440 Hz)
+_A4_CODE = NOTE_LABELS.index("A4")
+
+
+def frequencies_to_notes(frequencies: npt.ArrayLike) -> np.ndarray:
+    """
+    Map frequencies to the code of the nearest note in `NOTE_LABELS`.
+
+    Parameters
+    ----------
+    frequencies : npt.ArrayLike
+        Positive frequencies in Hz.
+
+    Returns
+    -------
+    np.ndarray
+        Note codes as uint8, frequencies out of the range C0-C8 are clipped
+        to the nearest end.
+    """
+    semitones = np.rint(12 * np.log2(np.asarray(frequencies) / 440.0))
+    codes = np.clip(semitones + _A4_CODE, 0, len(NOTE_LABELS) - 1)
+    return codes.astype(np.uint8)
+
+
+def notes_to_labels(codes: npt.ArrayLike) -> list[str]:
+    """Convert note codes into labels (e.g. "A4", "C#5")."""
+    return _NOTE_LABELS_ARRAY[np.asarray(codes, dtype=np.intp)].tolist()
+
+
+# matches the longest note from NOTES_FREQ at the beginning of a token
+_NOTE_PATTERN = re.compile(
+    "|".join(
+        re.escape(note) for note in sorted(NOTES_FREQ, key=len, reverse=True)
+    )
+)
+
+
+def resolve_notes(tokens: list[str]) -> list[str]:
+    """
+    Resolve tokens into notes available in `NOTES_FREQ`.
+
+    Each token is resolved to the longest note that is a prefix of it
+    (e.g. "C#9" becomes "C"). A token without any valid note repeats the
+    previous note, and it is dropped if there is no previous note yet.
+
+    Parameters
+    ----------
+    tokens : list[str]
+        Notes, usually loaded from a JSON file.
+
+    Returns
+    -------
+    list[str]
+        The resolved notes.
+    """
+    resolved: dict[str, str] = {}
+    match = _NOTE_PATTERN.match
+    notes: list[str] = []
+
+    for token in tokens:
+        note = resolved.get(token)
+        if note is None:
+            found = match(token)
+            note = found.group() if found else ""
+            resolved[token] = note
+
+        if note:
+            notes.append(note)
+        elif notes:
+            # replicate the last note
+            notes.append(notes[-1])
+
+    return notes
+
+
+# number of pitch hops decoded at once by `extract_notes_from_mp3`
+PITCH_BLOCK_HOPS = 256
+
+EIGHT_BIT_SAMPLE_RATE = 22050
+EIGHT_BIT_BLOCK_SECONDS = 30
+EIGHT_BIT_OVERLAP_SECONDS = 1
+
+SYNTH_SAMPLE_RATE = 44100
+# number of notes rendered per vectorized block, it bounds the size of the
+# temporary arrays used by the synthesis
+SYNTH_BLOCK_NOTES = 256
+
+
+def synthesize_notes(
+    frequencies: list[float],
+    note_duration: float,
+    sample_rate: int = SYNTH_SAMPLE_RATE,
+    volume: float = 0.0,
+) -> np.ndarray:
+    """
+    Render a sequence of notes as a phase-continuous sine wave.
+
+    The whole sequence is written into a single preallocated 16-bit buffer.
+    The waveform tables are computed once per distinct note and the phase
+    is carried from one note to the next, so there are no clicks between
+    notes.
+
+    Parameters
+    ----------
+    frequencies : list[float]
+        Frequency in Hz of each note of the sequence.
+    note_duration : float
+        Duration of each note in milliseconds.
+    sample_rate : int
+        Sample rate of the generated audio.
+    volume : float
+        Volume in dB relative to the maximum amplitude.
+
+    Returns
+    -------
+    np.ndarray
+        Mono samples as int16.
+    """
+    note_samples = int(sample_rate * (note_duration / 1000.0))
+    n_notes = len(frequencies)
+    samples = np.empty(n_notes * note_samples, dtype=np.int16)
+
+    if not n_notes or not note_samples:
+        return samples
+
+    unique_freqs, note_index = np.unique(
+        np.asarray(frequencies, dtype=np.float64), return_inverse=True
+    )
+    phase_step = 2 * np.pi * unique_freqs / sample_rate
+
+    # one table per distinct note: sin(a + b) = sin(a)cos(b) + cos(a)sin(b)
+    steps = np.arange(note_samples, dtype=np.float64)
+    sin_table = np.sin(np.outer(phase_step, steps)).astype(np.float32)
+    cos_table = np.cos(np.outer(phase_step, steps)).astype(np.float32)
+
+    # phase at the beginning of each note
+    note_phase = phase_step[note_index] * note_samples
+    start_phase = np.concatenate(([0.0], np.cumsum(note_phase)[:-1]))
+    start_phase = np.mod(start_phase, 2 * np.pi)
+
+    amplitude = np.float32(32767 * 10 ** (volume / 20))
+    start_sin = (np.sin(start_phase) * amplitude).astype(np.float32)
+    start_cos = (np.cos(start_phase) * amplitude).astype(np.float32)
+
+    rows = samples.reshape(n_notes, note_samples)
+    for start in range(0, n_notes, SYNTH_BLOCK_NOTES):
+        block = slice(start, start + SYNTH_BLOCK_NOTES)
+        index = note_index[block]
+        wave = start_sin[block, None] * cos_table[index]
+        wave += start_cos[block, None] * sin_table[index]
+        rows[block] = wave
+
+    return samples
+
+
+SPECTROGRAM_SAMPLE_RATE = 22050
+SPECTROGRAM_N_FFT = 2048
+SPECTROGRAM_HOP_LENGTH = 512
+SPECTROGRAM_N_MELS = 128
+SPECTROGRAM_FMAX = 8000
+SPECTROGRAM_N_MFCC = 20
+
+# features that can be exported by `Sound.spectrogram`
+FEATURES = ("mel", "linear", "chroma", "mfcc")
+FEATURE_DTYPES = ("float16", "float32")
+
+# frames computed per decoded block by `stream_mel_spectrogram`
+STREAM_BLOCK_FRAMES = 2048
+# width, in frames, of the images of the streaming spectrograms
+SPECTROGRAM_MAX_FRAMES = 4096
+# fixed size of the .npy header, so it can be rewritten with the final shape
+NPY_HEADER_SIZE = 128
+
+
+@functools.lru_cache(maxsize=16)
+def mel_filterbank(
+    sample_rate: int, n_fft: int, n_mels: int, fmax: float
+) -> np.ndarray:
+    """
+    Return the mel filterbank for the given parameters.
+
+    The filterbank is computed once per process and parameters, and reused
+    for all the spectrograms. The returned array is read-only.
+    """
+    import librosa
+
+    basis = librosa.filters.mel(
+        sr=sample_rate, n_fft=n_fft, n_mels=n_mels, fmax=fmax
+    )
+    basis.setflags(write=False)
+    return basis
+
+
+def power_spectrogram(
+    samples: np.ndarray,
+    *,
+    n_fft: int = SPECTROGRAM_N_FFT,
+    hop_length: int = SPECTROGRAM_HOP_LENGTH,
+) -> np.ndarray:
+    """Compute the power spectrogram (squared STFT magnitude)."""
+    import librosa
+
+    power = np.abs(librosa.stft(samples, n_fft=n_fft, hop_length=hop_length))
+    power **= 2
+    return power
+
+
+def mel_spectrogram_db(
+    samples: np.ndarray,
+    sample_rate: int,
+    *,
+    n_fft: int = SPECTROGRAM_N_FFT,
+    hop_length: int = SPECTROGRAM_HOP_LENGTH,
+    n_mels: int = SPECTROGRAM_N_MELS,
+    fmax: float = SPECTROGRAM_FMAX,
+) -> np.ndarray:
+    """
+    Compute the mel spectrogram of mono samples, in dB relative to its max.
+
+    It is equivalent to `librosa.feature.melspectrogram` followed by
+    `librosa.power_to_db`, but the mel filterbank is cached.
+    """
+    import librosa
+
+    power = power_spectrogram(samples, n_fft=n_fft, hop_length=hop_length)
+    mel = mel_filterbank(sample_rate, n_fft, n_mels, fmax) @ power
+    return librosa.power_to_db(mel, ref=np.max)
+
+
+def compute_features(
+    power: np.ndarray,
+    sample_rate: int,
+    features: list[str],
+    *,
+    n_fft: int = SPECTROGRAM_N_FFT,
+    n_mels: int = SPECTROGRAM_N_MELS,
+    fmax: float = SPECTROGRAM_FMAX,
+) -> dict[str, np.ndarray]:
+    """
+    Compute audio features from a power spectrogram.
+
+    Parameters
+    ----------
+    power : np.ndarray
+        Power spectrogram, see `power_spectrogram`.
+    sample_rate : int
+        Sample rate of the audio.
+    features : list[str]
+        Features to compute, any of:
+        - `mel`: mel power spectrogram, in dB (relative to 1.0);
+        - `linear`: linear power spectrogram, in dB (relative to 1.0);
+        - `chroma`: chromagram, with 12 pitch classes;
+        - `mfcc`: mel-frequency cepstral coefficients, from `mel`.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Matrix of each feature, with shape (bins, frames).
+    """
+    import librosa
+
+    unknown = set(features) - set(FEATURES)
+    if unknown:
+        raise Exception(
+            f"Features not supported: {', '.join(sorted(unknown))} "
+            f"(options: {', '.join(FEATURES)})."
+        )
+
+    result: dict[str, np.ndarray] = {}
+    if "mel" in features or "mfcc" in features:
+        mel = mel_filterbank(sample_rate, n_fft, n_mels, fmax) @ power
+        mel_db = librosa.power_to_db(mel)
+        if "mel" in features:
+            result["mel"] = mel_db
+        if "mfcc" in features:
+            result["mfcc"] = librosa.feature.mfcc(
+                S=mel_db, n_mfcc=SPECTROGRAM_N_MFCC
+            )
+    if "linear" in features:
+        result["linear"] = librosa.power_to_db(power)
+    if "chroma" in features:
+        result["chroma"] = librosa.feature.chroma_stft(
+            S=power, sr=sample_rate, n_fft=n_fft
+        )
+    return {name: result[name] for name in features}
+
+
+def save_features(
+    features: dict[str, np.ndarray], output_path: str, dtype: str = "float32"
+) -> list[str]:
+    """
+    Save audio features as NumPy arrays.
+
+    With a `.npz` path, all the features are saved in a single
+    (uncompressed) archive, with one array per feature. Otherwise, each
+    feature is saved as a `.npy` file, which can be memory-mapped with
+    `np.load(path, mmap_mode="r")`: a single feature is saved at
+    `output_path`, and many features at `<name>-<feature>.npy`.
+
+    Returns
+    -------
+    list[str]
+        The paths of the files saved.
+    """
+    if dtype not in FEATURE_DTYPES:
+        raise Exception(
+            f"Type `{dtype}` not supported "
+            f"(options: {', '.join(FEATURE_DTYPES)})."
+        )
+    arrays = {
+        name: np.ascontiguousarray(matrix, dtype=dtype)
+        for name, matrix in features.items()
+    }
+
+    path = Path(output_path)
+    if path.suffix.lower() == ".npz":
+        np.savez(path, **arrays)
+        return [str(path)]
+
+    if len(arrays) == 1:
+        paths = {name: path.with_suffix(".npy") for name in arrays}
+    else:
+        paths = {
+            name: path.with_name(f"{path.stem}-{name}.npy") for name in arrays
+        }
+    for name, matrix in arrays.items():
+        np.save(paths[name], matrix)
+    return [str(p) for p in paths.values()]
+
+
+def _npy_header(shape: tuple[int, ...], dtype: npt.DTypeLike) -> bytes:
+    """Return a .npy (version 1.0) header of `NPY_HEADER_SIZE` bytes."""
+    header = repr(
+        {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": True,
+            "shape": tuple(shape),
+        }
+    )
+    magic = b"\x93NUMPY\x01\x00"
+    header_size = NPY_HEADER_SIZE - len(magic) - 2
+    if len(header) >= header_size:
+        raise Exception(f"Shape {shape} doesn't fit in the .npy header.")
+    header = header.ljust(header_size - 1) + "\n"
+    return magic + struct.pack("<H", header_size) + header.encode("latin1")
+
+
+def stream_mel_spectrogram(
+    source: Union[str, AudioBuffer],
+    output_path: str,
+    sample_rate: int = SPECTROGRAM_SAMPLE_RATE,
+    *,
+    n_fft: int = SPECTROGRAM_N_FFT,
+    hop_length: int = SPECTROGRAM_HOP_LENGTH,
+    n_mels: int = SPECTROGRAM_N_MELS,
+    fmax: float = SPECTROGRAM_FMAX,
+) -> np.memmap:
+    """
+    Compute the mel spectrogram of a file block by block, into a .npy file.
+
+    The `source` is the path of the file or the decoded audio (e.g.
+    memory-mapped by `load_cached_audio`), whose own sample rate is used
+    then. The audio is read in blocks of `STREAM_BLOCK_FRAMES` frames, and the
+    frames of each block are appended to the output file as soon as they
+    are computed, so the memory used doesn't depend on the duration of the
+    audio. The frames are the same as the ones of `power_spectrogram`
+    (centered, with zero padding). The array is stored in Fortran order,
+    with shape (n_mels, frames), and its header is rewritten with the final
+    number of frames at the end.
+
+    Returns
+    -------
+    np.memmap
+        The mel spectrogram in dB (relative to 1.0, without `top_db`),
+        memory-mapped from `output_path`.
+    """
+    import librosa
+
+    block_size = STREAM_BLOCK_FRAMES * hop_length
+    if isinstance(source, AudioBuffer):
+        sample_rate = source.sample_rate
+        blocks = iter_buffer_blocks(
+            AudioBuffer(source.to_mono(), sample_rate), block_size
+        )
+    else:
+        blocks = iter_audio_blocks(source, block_size, sample_rate)
+
+    basis = mel_filterbank(sample_rate, n_fft, n_mels, fmax)
+    pad = np.zeros(n_fft // 2, dtype=np.float32)
+    n_frames = 0
+
+    with open(output_path, "wb") as f:
+        f.write(_npy_header((n_mels, 0), np.float32))
+
+        def write_frames(samples: np.ndarray) -> np.ndarray:
+            """Write the complete frames, returning the samples left."""
+            nonlocal n_frames
+            if len(samples) < n_fft:
+                return samples
+            count = 1 + (len(samples) - n_fft) // hop_length
+            stft = librosa.stft(
+                samples[: (count - 1) * hop_length + n_fft],
+                n_fft=n_fft,
+                hop_length=hop_length,
+                center=False,
+            )
+            mel_db = librosa.power_to_db(
+                basis @ np.abs(stft) ** 2, top_db=None
+            )
+            # Fortran order: the frames are contiguous
+            f.write(mel_db.T.astype(np.float32).tobytes())
+            n_frames += count
+            return samples[count * hop_length :]
+
+        rest = pad
+        for block in blocks:
+            rest = write_frames(np.concatenate((rest, block)))
+        write_frames(np.concatenate((rest, pad)))
+
+        f.seek(0)
+        f.write(_npy_header((n_mels, n_frames), np.float32))
+
+    return np.load(output_path, mmap_mode="r")
+
+
+def downsample_frames(
+    spectrogram: np.ndarray, max_frames: int
+) -> tuple[np.ndarray, int]:
+    """
+    Reduce the number of frames of a spectrogram to at most `max_frames`.
+
+    Groups of consecutive frames are replaced by their maximum, so peaks
+    are kept. The spectrogram is read in blocks, so it can be a large
+    memory-mapped array.
+
+    Returns
+    -------
+    tuple[np.ndarray, int]
+        The downsampled spectrogram (always a new array) and the number of
+        frames per group.
+    """
+    n_bins, n_frames = spectrogram.shape
+    factor = max(1, math.ceil(n_frames / max(max_frames, 1)))
+    if factor == 1:
+        return np.array(spectrogram, dtype=np.float32), 1
+
+    result = np.empty((n_bins, math.ceil(n_frames / factor)), np.float32)
+    step = factor * max(1, STREAM_BLOCK_FRAMES // factor)
+    for start in range(0, n_frames, step):
+        block = np.asarray(spectrogram[:, start : start + step])
+        n_groups = math.ceil(block.shape[1] / factor)
+        padded = np.full((n_bins, n_groups * factor), -np.inf, np.float32)
+        padded[:, : block.shape[1]] = block
+        result[:, start // factor : start // factor + n_groups] = (
+            padded.reshape(n_bins, n_groups, factor).max(axis=2)
+        )
+    return result, factor
+
+
+def render_spectrogram(
+    spectrogram_db: np.ndarray,
+    output_path: str,
+    sample_rate: int,
+    *,
+    hop_length: int = SPECTROGRAM_HOP_LENGTH,
+    fmax: float = SPECTROGRAM_FMAX,
+    plain: bool = False,
+) -> None:
+    """
+    Save a mel spectrogram (in dB) as an image.
+
+    The figure is rendered by the Agg backend through the object-oriented
+    API, without the global state of pyplot, so it can be used from many
+    threads. If `plain` is True, the matrix is written straight to the
+    image through the colormap, without axes, title or colorbar, which is
+    much faster (e.g. for thumbnails).
+    """
+    if plain:
+        from matplotlib.image import imsave
+
+        # low frequencies at the bottom
+        imsave(output_path, spectrogram_db[::-1], cmap="magma")
+        return
+
+    import librosa.display
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    image = librosa.display.specshow(
+        spectrogram_db,
+        sr=sample_rate,
+        hop_length=hop_length,
+        x_axis="time",
+        y_axis="mel",
+        fmax=fmax,
+        ax=ax,
+    )
+    fig.colorbar(image, ax=ax, format="%+2.0f dB")
+    ax.set_title("Mel-frequency spectrogram")
+    fig.tight_layout()
+    fig.savefig(output_path)
+
+
+def _spectrogram_file(args: dict[str, Any]) -> Optional[str]:
+    """Save the spectrogram of a file, returning the error, if any."""
+    try:
+        Sound(args).spectrogram()
+    except Exception as e:
+        return f"{args['input-path']}: {e}"
+    return None
+
 
 class Sound(ArtBox):
-    """A set of methods for handing and creating sounds."""
+    """
+    A set of methods for handing and creating sounds.
 
-    def process_notes(self, notes: list[str]) -> list[str]:
-        """Process notes according to the available notes' table."""
-        filtered_notes = []
+    The methods that analyse an audio file read it through the decoded
+    audio cache (see `load_cached_audio`), so running several of them on
+    the same file decodes it only once. The argument `cache-dir` sets the
+    cache directory and `no-cache` decodes the file every time.
+    """
 
-        for note in notes:
-            # example of n: C#1
-            processed_note = ""
-            while note:
-                if note in NOTES_FREQ:
-                    processed_note = note
-                    break
-                note = note[:-1]  # noqa: PLW2901
+    def _load_audio(self, sample_rate: Optional[int] = None) -> AudioBuffer:
+        """
+        Decode the input file as mono audio.
+
+        The audio is read through the decoded audio cache (see
+        `load_cached_audio`), in the directory given by `cache-dir`, unless
+        `no-cache` is given.
+        """
+        file_path = str(self.input_path)
+        if self.args.get("no-cache"):
+            return decode_audio(file_path, sample_rate)
+        return load_cached_audio(
+            file_path,
+            sample_rate,
+            cache_dir=self.args.get("cache-dir") or None,
+        )
+
+    def _iter_audio_blocks(
+        self, block_size: int, sample_rate: Optional[int] = None
+    ) -> Iterator[np.ndarray]:
+        """
+        Iterate over the mono audio of the input file in blocks.
 
-            if processed_note:
-                filtered_notes.append(processed_note)
-            elif filtered_notes:
-                # replicate the last note
-                filtered_notes.append(filtered_notes[-1])
+        On a cache miss, the blocks are written to the cache as they are
+        processed, see `iter_cached_audio_blocks`.
+        """
+        if self.args.get("no-cache"):
+            return iter_audio_blocks(
+                str(self.input_path), block_size, sample_rate
+            )
+        return iter_cached_audio_blocks(
+            str(self.input_path),
+            block_size,
+            sample_rate,
+            cache_dir=self.args.get("cache-dir") or None,
+        )
 
-        return filtered_notes
+    def process_notes(self, notes: list[str]) -> list[str]:
+        """Process notes according to the available notes' table."""
+        return resolve_notes(notes)
 
     def notes_to_audio(self):
         """
@@ -164,64 +733,102 @@ class Sound(ArtBox):
         if not total_duration:
             raise Exception("Argument `duration` was not given.")
 
-        melody = AudioSegment.silent(0)
-
-        notes = NOTES_FREQ
-
         # Define a simple sequence
         with open(notes_path, "r") as f:
             background_music_sequence = self.process_notes(json.load(f))
 
+        if not background_music_sequence:
+            raise Exception(f"No valid notes found in `{notes_path}`.")
+
         note_duration = round(
             (total_duration / len(background_music_sequence)) * 1000
         )
         # Generate melody
-        for note in background_music_sequence:
-            tone = Sine(notes[note]).to_audio_segment(duration=note_duration)
-            melody += tone
+        samples = synthesize_notes(
+            [NOTES_FREQ[note] for note in background_music_sequence],
+            note_duration,
+        )
 
+        melody = AudioSegment(
+            samples.tobytes(),
+            frame_rate=SYNTH_SAMPLE_RATE,
+            sample_width=2,
+            channels=1,
+        )
         melody.export(str(self.output_path), format="mp3")
 
     def convert_to_8bit_audio(self) -> None:
         """
-        Extract audio from an MP4 file and convert it to a 16-bit.
+        Extract audio from an MP4 file and convert it to a 8-bit.
 
         The result audio would be similar to the sound used by SNES and
         Sega Genesis.
+
+        The audio is processed in overlapping blocks, so the memory used
+        doesn't depend on the duration of the input. The noise profile is
+        estimated once, from the first block, and applied to every block.
         """
-        video_path = str(self.input_path)
+        import noisereduce as nr
+
         output_path = str(self.output_path)
 
-        # Load the video file
-        video_clip = VideoFileClip(video_path)
+        sample_rate = EIGHT_BIT_SAMPLE_RATE
+        block_size = sample_rate * EIGHT_BIT_BLOCK_SECONDS
+        overlap = sample_rate * EIGHT_BIT_OVERLAP_SECONDS
 
-        # Get audio as numpy array (stereo)
-        audio_array = video_clip.audio.to_soundarray(
-            fps=22050
-        )  # Downsample to 22050 Hz
+        # Encode the 8-bit PCM stream as it is produced
+        encoder = (
+            ffmpeg.input("pipe:", format="u8", ac=1, ar=sample_rate)
+            .output(output_path)
+            .overwrite_output()
+            .global_args("-loglevel", "error")
+            .run_async(pipe_stdin=True)
+        )
 
-        # Convert to mono by averaging the two channels
-        audio_mono = audio_array.mean(axis=1)
+        # Downsample to 22050 Hz and convert to mono while decoding
+        blocks = (
+            block.copy()
+            for block in self._iter_audio_blocks(block_size, sample_rate)
+        )
 
-        # Reduce noise
-        audio_denoised = nr.reduce_noise(y=audio_mono, sr=22050)
+        try:
+            current = next(blocks, None)
+            noise_clip = current
+            previous_tail = np.zeros(0, dtype=np.float32)
 
-        # Convert to 8-bit PCM format
-        audio_8bit = ((audio_denoised + 1) * 127.5).astype("uint8")
+            while current is not None:
+                following = next(blocks, None)
+                next_head = (
+                    following[:overlap]
+                    if following is not None
+                    else np.zeros(0, dtype=np.float32)
+                )
 
-        # Create an AudioSegment from the 8-bit array
-        audio_segment = AudioSegment(
-            audio_8bit.tobytes(),
-            frame_rate=22050,
-            sample_width=1,  # 1 byte = 8 bits
-            channels=1,
-        )
+                # Reduce noise, with the neighbour blocks as context
+                segment = np.concatenate((previous_tail, current, next_head))
+                denoised = nr.reduce_noise(
+                    y=segment,
+                    sr=sample_rate,
+                    y_noise=noise_clip,
+                    stationary=True,
+                )
+                start = len(previous_tail)
+                denoised = denoised[start : start + len(current)]
+
+                # Convert to 8-bit PCM format
+                audio_8bit = ((np.clip(denoised, -1, 1) + 1) * 127.5).astype(
+                    np.uint8
+                )
+                encoder.stdin.write(audio_8bit.tobytes())
 
-        # Export as WAV file
-        audio_segment.export(output_path, format="mp3")
+                previous_tail = current[-overlap:]
+                current = following
+        finally:
+            encoder.stdin.close()
+            returncode = encoder.wait()
 
-        # Close the video clip
-        video_clip.reader.close()
+        if returncode != 0:
+            raise Exception(f"ffmpeg could not encode `{output_path}`.")
 
         print(
             "Audio has been extracted and converted to 8-bit format "
@@ -242,88 +849,277 @@ class Sound(ArtBox):
         str
             Corresponding musical note (e.g., "A4", "C#5").
         """
-        notes = [
-            "C",
-            "C#",
-            "D",
-            "D#",
-            "E",
-            "F",
-            "F#",
-            "G",
-            "G#",
-            "A",
-            "A#",
-            "B",
-        ]
-        octave = int(frequency / 130.81)  # Based on C3 = 130.81 Hz
-        n = int(round(12 * log2(frequency / 440.0)) + 49) % 12
-        return f"{notes[n]}{octave}"
+        return NOTE_LABELS[int(frequencies_to_notes(frequency))]
 
     def extract_notes_from_mp3(self) -> list:
-        """Extra notes from a mp3 file."""
-        mp3_path = str(self.input_path)
+        """
+        Extract notes from an audio file.
+
+        The audio is decoded in blocks of bounded size, using the sample
+        rate of the file, and the notes are written to the output file as
+        they are detected.
+
+        Returns
+        -------
+        list
+            The detected notes.
+        """
+        import aubio
+
+        audio_path = str(self.input_path)
         output_notes = str(self.output_path)
 
         win_s = 2048  # Correct FFT size
         hop_s = win_s // 2  # Correct Hop size
 
-        # Convert MP3 to WAV using pydub
-        audio = AudioSegment.from_mp3(mp3_path)
-        audio = audio.set_channels(1)  # Convert to mono
-        samples = np.array(audio.get_array_of_samples())
+        sample_rate = probe_sample_rate(audio_path)
 
         # Create pitch detection object
-        pitch_o = aubio.pitch("default", win_s, hop_s, 44100)
+        pitch_o = aubio.pitch("default", win_s, hop_s, sample_rate)
         pitch_o.set_unit("Hz")
 
-        notes = []
-        for start in range(0, len(samples), hop_s):
-            chunk = samples[start : start + hop_s]
-
-            # Zero-pad the chunk if necessary
-            if len(chunk) < hop_s:
-                chunk = np.pad(
-                    chunk,
-                    (0, hop_s - len(chunk)),
-                    "constant",
-                    constant_values=0,
-                )
+        # buffer used to zero-pad the last chunk
+        last_chunk = np.zeros(hop_s, dtype=np.float32)
+        frequencies = np.zeros(PITCH_BLOCK_HOPS, dtype=np.float32)
 
-            chunk = chunk.astype("float32")
-            frequency = pitch_o(chunk)[0]
+        notes = array("B")
+        with open(output_notes, "w") as f:
+            f.write("[")
+            for block in self._iter_audio_blocks(
+                hop_s * PITCH_BLOCK_HOPS, sample_rate
+            ):
+                n_hops = 0
+                for start in range(0, len(block), hop_s):
+                    chunk = block[start : start + hop_s]
 
-            # Convert frequency to musical note and add to the list
-            if frequency > 0:  # Ignore zero frequencies (silence)
-                note = self.frequency_to_note(frequency)
-                notes.append(note)
+                    if len(chunk) < hop_s:
+                        last_chunk[: len(chunk)] = chunk
+                        chunk = last_chunk
 
-        with open(output_notes, "w") as f:
-            json.dump(notes, f)
+                    frequencies[n_hops] = pitch_o(chunk)[0]
+                    n_hops += 1
+
+                # Ignore zero frequencies (silence)
+                detected = frequencies[:n_hops]
+                codes = frequencies_to_notes(detected[detected > 0])
+                if not len(codes):
+                    continue
 
-        return notes
+                labels = notes_to_labels(codes)
+                if notes:
+                    f.write(", ")
+                f.write(", ".join(json.dumps(note) for note in labels))
+                notes.frombytes(codes.tobytes())
+            f.write("]")
 
-    def spectrogram(self):
-        """Generate a spectrogram from an MP3 file and saves it as an image."""
-        mp3_file_path = str(self.input_path)
-        output_file_path = str(self.output_path)
+        return notes_to_labels(notes)
+
+    def spectrogram(self, audio: Optional[AudioBuffer] = None) -> None:
+        """
+        Generate a spectrogram from an MP3 file and saves it as an image.
+
+        The arguments `n-fft`, `hop-length`, `n-mels` and `fmax` set the
+        parameters of the spectrogram, and `plain` saves only the
+        spectrogram, without axes (see `render_spectrogram`). If
+        `features-path` is given, the `features` (comma separated, by
+        default `mel`) are also saved there as `dtype` (`float32` or
+        `float16`) arrays, see `save_features`. The image is skipped if
+        `output-path` isn't given. With `max-frames`, the image is
+        downsampled in time, and with `stream`, the audio is processed in
+        blocks, see `spectrogram_streaming`.
+
+        Parameters
+        ----------
+        audio : AudioBuffer, optional
+            Audio already decoded (e.g. by a previous stage of a pipeline),
+            used instead of loading the file from `input-path`.
+        """
+        import librosa
+
+        if self.args.get("stream") and audio is None:
+            self.spectrogram_streaming()
+            return
+
+        n_fft = int(self.args.get("n-fft") or SPECTROGRAM_N_FFT)
+        hop_length = int(self.args.get("hop-length") or SPECTROGRAM_HOP_LENGTH)
+        n_mels = int(self.args.get("n-mels") or SPECTROGRAM_N_MELS)
+        fmax = float(self.args.get("fmax") or SPECTROGRAM_FMAX)
+        features_path = self.args.get("features-path")
 
         # Load the audio file
-        y, sr = librosa.load(mp3_file_path)
+        if audio is None:
+            audio = self._load_audio(SPECTROGRAM_SAMPLE_RATE)
+
+        power = power_spectrogram(
+            audio.to_mono(), n_fft=n_fft, hop_length=hop_length
+        )
+
+        # Save the raw features
+        if features_path:
+            features = [
+                name.strip()
+                for name in (self.args.get("features") or "mel").split(",")
+                if name.strip()
+            ]
+            save_features(
+                compute_features(
+                    power,
+                    audio.sample_rate,
+                    features,
+                    n_fft=n_fft,
+                    n_mels=n_mels,
+                    fmax=fmax,
+                ),
+                features_path,
+                self.args.get("dtype") or "float32",
+            )
+            if not self.args.get("output-path"):
+                return
 
         # Generate a spectrogram
-        S = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128, fmax=8000)
-        S_dB = librosa.power_to_db(S, ref=np.max)
+        mel = mel_filterbank(audio.sample_rate, n_fft, n_mels, fmax) @ power
+        S_dB = librosa.power_to_db(mel, ref=np.max)
 
-        # Plot the spectrogram
-        plt.figure(figsize=(10, 4))
-        librosa.display.specshow(
-            S_dB, sr=sr, x_axis="time", y_axis="mel", fmax=8000
-        )
-        plt.colorbar(format="%+2.0f dB")
-        plt.title("Mel-frequency spectrogram")
-        plt.tight_layout()
+        factor = 1
+        max_frames = int(self.args.get("max-frames") or 0)
+        if max_frames:
+            S_dB, factor = downsample_frames(S_dB, max_frames)
 
         # Save the spectrogram as an image
-        plt.savefig(output_file_path)
-        plt.close()  # Close the plot to free up memory
+        render_spectrogram(
+            S_dB,
+            str(self.output_path),
+            audio.sample_rate,
+            hop_length=hop_length * factor,
+            fmax=fmax,
+            plain=bool(self.args.get("plain")),
+        )
+
+    def spectrogram_streaming(self) -> None:
+        """
+        Generate the spectrogram of a long audio, with bounded memory.
+
+        The mel spectrogram is computed block by block into a memory-mapped
+        .npy file (see `stream_mel_spectrogram`): the `features-path`, if
+        given, or a temporary file. The image is downsampled in time to at
+        most `max-frames` frames (by default, `SPECTROGRAM_MAX_FRAMES`).
+        Only the `mel` feature is supported in this mode.
+        """
+        n_fft = int(self.args.get("n-fft") or SPECTROGRAM_N_FFT)
+        hop_length = int(self.args.get("hop-length") or SPECTROGRAM_HOP_LENGTH)
+        n_mels = int(self.args.get("n-mels") or SPECTROGRAM_N_MELS)
+        fmax = float(self.args.get("fmax") or SPECTROGRAM_FMAX)
+        max_frames = int(self.args.get("max-frames") or SPECTROGRAM_MAX_FRAMES)
+        features_path = self.args.get("features-path")
+
+        if features_path and (
+            Path(features_path).suffix.lower() != ".npy"
+            or (self.args.get("features") or "mel") != "mel"
+        ):
+            raise Exception(
+                "The streaming spectrogram only saves the `mel` feature, "
+                "as a .npy file."
+            )
+
+        if features_path:
+            spectrogram_path: str = features_path
+        else:
+            fd, spectrogram_path = tempfile.mkstemp(
+                suffix=".npy", dir=self.output_path.parent
+            )
+            os.close(fd)
+
+        try:
+            spectrogram = stream_mel_spectrogram(
+                str(self.input_path)
+                if self.args.get("no-cache")
+                else self._load_audio(SPECTROGRAM_SAMPLE_RATE),
+                spectrogram_path,
+                n_fft=n_fft,
+                hop_length=hop_length,
+                n_mels=n_mels,
+                fmax=fmax,
+            )
+            if not self.args.get("output-path"):
+                return
+
+            S_dB, factor = downsample_frames(spectrogram, max_frames)
+            del spectrogram
+            # relative to the max, as `librosa.power_to_db(ref=np.max)`
+            S_dB -= S_dB.max()
+            np.maximum(S_dB, -80.0, out=S_dB)
+
+            render_spectrogram(
+                S_dB,
+                str(self.output_path),
+                SPECTROGRAM_SAMPLE_RATE,
+                hop_length=hop_length * factor,
+                fmax=fmax,
+                plain=bool(self.args.get("plain")),
+            )
+        finally:
+            if not features_path:
+                os.remove(spectrogram_path)
+
+    def spectrogram_batch(self) -> int:
+        """
+        Generate the spectrograms of many files, in parallel processes.
+
+        The argument `input-path` is a directory (walked recursively) or a
+        glob pattern, and `output-path` is the directory where the images
+        are saved, with the same name (and relative path, for a directory)
+        as the audio files, but with the `.png` extension. The files are
+        processed by a pool of `workers` processes (by default, the number
+        of CPU cores), each one reusing its mel filterbank. If
+        `features-path` is given, it is the directory where the features
+        are saved, as `.npy` files (or `.npz`, for many features). Each file
+        is decoded once anyway, so the decoded audio cache is only used if
+        `cache-dir` is given.
+
+        Returns
+        -------
+        int
+            Number of files processed.
+        """
+        workers = int(self.args.get("workers") or 0) or os.cpu_count() or 1
+        features_dir = self.args.get("features-path")
+        features_suffix = ".npy"
+        if "," in (self.args.get("features") or ""):
+            features_suffix = ".npz"
+
+        tasks = []
+        for path, output_path in iter_batch_paths(
+            str(self.input_path), self.output_path, ".png"
+        ):
+            task = {
+                **self.args,
+                "input-path": str(path),
+                "output-path": str(output_path),
+                "no-cache": self.args.get("no-cache")
+                or not self.args.get("cache-dir"),
+            }
+            if features_dir:
+                features_path = Path(features_dir) / output_path.relative_to(
+                    self.output_path
+                ).with_suffix(features_suffix)
+                features_path.parent.mkdir(parents=True, exist_ok=True)
+                task["features-path"] = str(features_path)
+            tasks.append(task)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            errors = [
+                error
+                for error in executor.map(_spectrogram_file, tasks)
+                if error
+            ]
+
+        print(
+            f"{len(tasks) - len(errors)} spectrograms have been generated. "
+            f"Output saved at '{self.output_path}'."
+        )
+        if errors:
+            raise Exception(
+                f"{len(errors)} of {len(tasks)} files failed:\n"
+                + "\n".join(errors)
+            )
+        return len(tasks)
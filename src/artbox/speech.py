@@ -5,26 +5,442 @@ ref: https://thepythoncode.com/article/convert-text-to-speech-in-python
 """
 
 import asyncio
+import functools
+import hashlib
+import inspect
+import io
+import json
 import os
 import random
+import re
+import textwrap
+import threading
+import unicodedata
 
-from abc import ABC
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, BinaryIO, Callable, Hashable, Optional
 
+import aiohttp
 import edge_tts
 import gtts
+import numpy as np
+import requests
 import speech_recognition as sr
 
 from edge_tts import VoicesManager
-from pydub import AudioSegment
+from edge_tts.exceptions import NoAudioReceived, WebSocketError
 
-from artbox.base import ArtBox
+from artbox.audio import AudioBuffer, decode_audio, split_on_silence
+from artbox.base import ArtBox, iter_batch_paths
+from artbox.cache import evict_lru, get_cache_dir, link_or_copy, touch
 
+# sample rate used to decode the audio in long-audio mode
+LONG_AUDIO_SAMPLE_RATE = 16000
 
-def convert_mp3_to_wav(input_path: str, output_path: str) -> None:
-    """Convert from mp3 to wav."""
-    sound = AudioSegment.from_mp3(input_path)
-    sound.export(output_path, format="wav")
+# memory budget of the speech recognition models kept loaded
+MODEL_CACHE_MAX_BYTES = 4 * 1024**3
+VOSK_SAMPLE_RATE = 16000
+WHISPER_SAMPLE_RATE = 16000
+
+# number of texts (or chunks of a long text) synthesized at the same time
+DEFAULT_TTS_CONCURRENCY = 8
+# attempts after a transient error and delay before the first one (seconds)
+TTS_RETRIES = 3
+TTS_RETRY_DELAY = 1.0
+
+# size limit of the cache of synthesized audio files
+TTS_CACHE_MAX_BYTES = 1024**3
+
+# edge-tts times are given in ticks of 100ns, and its audio is a 48 kbps
+# CBR MP3, so the duration of the audio is given by its size
+TICKS_PER_SECOND = 10_000_000
+EDGE_TTS_BITRATE = 48_000
+# maximum number of characters of a subtitle in the timings sidecar
+MAX_CUE_CHARS = 42
+TIMINGS_FORMATS = ("srt", "json")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+|(?<=[\u3002\uff01\uff1f])\s*")
+
+_voices_manager: Optional[VoicesManager] = None
+
+
+async def get_voices_manager() -> VoicesManager:
+    """Return the edge-tts voices, fetching the list once per process."""
+    global _voices_manager  # noqa: PLW0603
+    if _voices_manager is None:
+        _voices_manager = await VoicesManager.create()
+    return _voices_manager
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a text for the TTS cache keys.
+
+    The text is converted to the NFC form, the whitespace of each paragraph
+    is collapsed and the paragraphs are separated by a blank line.
+    """
+    text = unicodedata.normalize("NFC", text)
+    paragraphs = (" ".join(p.split()) for p in re.split(r"\n\s*\n", text))
+    return "\n\n".join(p for p in paragraphs if p)
+
+
+def split_text(text: str, max_chars: int) -> list[str]:
+    """
+    Split a text into chunks of at most `max_chars` characters.
+
+    The chunks are cut at paragraph or sentence boundaries, and they pack
+    as many sentences as fit. A sentence longer than `max_chars` is cut
+    between words.
+
+    Parameters
+    ----------
+    text : str
+        The text to split.
+    max_chars : int
+        Maximum number of characters of a chunk.
+
+    Returns
+    -------
+    list[str]
+        The chunks, in order.
+    """
+    chunks: list[str] = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        separator = "\n\n"
+        for sentence in _SENTENCE_END.split(" ".join(paragraph.split())):
+            for piece in textwrap.wrap(
+                sentence,
+                max_chars,
+                break_long_words=False,
+                break_on_hyphens=False,
+            ):
+                if not current:
+                    current = piece
+                elif len(current) + len(separator) + len(piece) > max_chars:
+                    chunks.append(current)
+                    current = piece
+                else:
+                    current = f"{current}{separator}{piece}"
+                separator = " "
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def format_srt_time(seconds: float) -> str:
+    """Format a time in seconds as a SubRip timestamp (HH:MM:SS,mmm)."""
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+
+def segments_to_srt(segments: list[tuple[float, float, str]]) -> str:
+    """Format (start, end, text) segments as SubRip subtitles."""
+    entries = [
+        f"{index}\n{format_srt_time(start)} --> {format_srt_time(end)}\n"
+        f"{text}\n"
+        for index, (start, end, text) in enumerate(segments, start=1)
+    ]
+    return "\n".join(entries)
+
+
+class WordBoundaries:
+    """
+    Timing of the words of a synthesized speech.
+
+    The offsets and durations are kept in arrays of ticks (100ns), as
+    given by edge-tts, so long texts take little memory.
+
+    Attributes
+    ----------
+    offsets : array
+        Start of each word.
+    durations : array
+        Duration of each word.
+    words : list[str]
+        The words.
+    audio_duration : int
+        Duration of the whole audio, used to join the timings of
+        consecutive audios.
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty timings."""
+        self.offsets = array("q")
+        self.durations = array("q")
+        self.words: list[str] = []
+        self.audio_duration = 0
+
+    def __len__(self) -> int:
+        """Return the number of words."""
+        return len(self.words)
+
+    def append(self, offset: int, duration: int, word: str) -> None:
+        """Add the timing of a word."""
+        self.offsets.append(offset)
+        self.durations.append(duration)
+        self.words.append(word)
+
+    def extend(self, other: "WordBoundaries") -> None:
+        """Add the timings of an audio that follows this one."""
+        shift = self.audio_duration
+        self.offsets.extend(offset + shift for offset in other.offsets)
+        self.durations.extend(other.durations)
+        self.words.extend(other.words)
+        self.audio_duration += other.audio_duration
+
+    def to_segments(
+        self, max_chars: int = MAX_CUE_CHARS
+    ) -> list[tuple[float, float, str]]:
+        """Group the words into (start, end, text) segments, in seconds."""
+        segments = []
+        start = end = 0
+        text = ""
+        for offset, duration, word in zip(
+            self.offsets, self.durations, self.words
+        ):
+            if text and len(text) + 1 + len(word) > max_chars:
+                segments.append((start, end, text))
+                text = ""
+            if not text:
+                start = offset
+                text = word
+            else:
+                text = f"{text} {word}"
+            end = offset + duration
+        if text:
+            segments.append((start, end, text))
+        return [
+            (start / TICKS_PER_SECOND, end / TICKS_PER_SECOND, text)
+            for start, end, text in segments
+        ]
+
+    def to_json(self) -> str:
+        """Return the timing of each word (in seconds) as JSON."""
+        return json.dumps(
+            [
+                {
+                    "word": word,
+                    "start": offset / TICKS_PER_SECOND,
+                    "end": (offset + duration) / TICKS_PER_SECOND,
+                }
+                for offset, duration, word in zip(
+                    self.offsets, self.durations, self.words
+                )
+            ],
+            indent=2,
+        )
+
+    def save(self, path: Path) -> None:
+        """Save the timings as SubRip subtitles or JSON, by the extension."""
+        if path.suffix.lower() == ".srt":
+            data = segments_to_srt(self.to_segments())
+        else:
+            data = self.to_json()
+        with open(path, "w") as f:
+            f.write(data)
+
+
+def timings_path(output_path: Path, timings: str) -> Path:
+    """Return the path of the timings sidecar of an audio file."""
+    if timings not in TIMINGS_FORMATS:
+        raise Exception(
+            f"Timings format `{timings}` not supported "
+            f"(options: {', '.join(TIMINGS_FORMATS)})."
+        )
+    return output_path.with_suffix(f".{timings}")
+
+
+class ModelCache:
+    """
+    LRU cache of loaded models, bounded by their size in memory.
+
+    The least recently used models are dropped when the total size exceeds
+    `max_bytes`, but the last model loaded is always kept. Models are loaded
+    under a lock, so concurrent threads don't load the same model twice.
+    """
+
+    def __init__(self, max_bytes: int = MODEL_CACHE_MAX_BYTES) -> None:
+        """Initialize an empty cache."""
+        self.max_bytes = max_bytes
+        self._models: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        key: Hashable,
+        load: Callable[[], Any],
+        size: Callable[[Any], int],
+    ) -> Any:
+        """
+        Return the model for `key`, loading it if it isn't cached.
+
+        Parameters
+        ----------
+        key : Hashable
+            Identifier of the model, e.g. (engine, model name).
+        load : Callable
+            Function that loads the model.
+        size : Callable
+            Function that returns the size of the loaded model in bytes.
+        """
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key][0]
+
+            model = load()
+            self._models[key] = (model, size(model))
+            total = sum(model_size for _, model_size in self._models.values())
+            while total > self.max_bytes and len(self._models) > 1:
+                _, (_, model_size) = self._models.popitem(last=False)
+                total -= model_size
+            return model
+
+    def clear(self) -> None:
+        """Drop all the cached models."""
+        with self._lock:
+            self._models.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Return True if the model for `key` is loaded."""
+        return key in self._models
+
+
+model_cache = ModelCache()
+
+# engine name -> function(audio_data, language, model) returning the text
+RecognizerEngine = Callable[[sr.AudioData, str, str], str]
+RECOGNIZER_ENGINES: dict[str, RecognizerEngine] = {}
+
+_recognizer = sr.Recognizer()
+
+
+def register_recognizer_engine(
+    name: str,
+) -> Callable[[RecognizerEngine], RecognizerEngine]:
+    """Register a speech recognition engine, used as a decorator."""
+
+    def decorator(func: RecognizerEngine) -> RecognizerEngine:
+        RECOGNIZER_ENGINES[name] = func
+        return func
+
+    return decorator
+
+
+def _online_engine(method_name: str) -> RecognizerEngine:
+    """Create an engine for a web service supported by SpeechRecognition."""
+
+    def recognize(audio_data: sr.AudioData, language: str, model: str) -> str:
+        method = getattr(_recognizer, method_name)
+        return method(audio_data=audio_data, language=language)
+
+    return recognize
+
+
+for _name in ("google", "google_cloud", "wit", "azure", "houndify", "ibm"):
+    register_recognizer_engine(_name)(_online_engine(f"recognize_{_name}"))
+
+
+@register_recognizer_engine("whisper-api")
+def _recognize_whisper_api(
+    audio_data: sr.AudioData, language: str, model: str
+) -> str:
+    return _recognizer.recognize_whisper_api(audio_data)
+
+
+def _directory_size(path: str) -> int:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+@register_recognizer_engine("vosk")
+def _recognize_vosk(
+    audio_data: sr.AudioData, language: str, model: str
+) -> str:
+    """
+    Recognize speech with a local Vosk model.
+
+    `model` is the path of the unpacked model, by default `model` in the
+    current directory, as SpeechRecognition does. The language is given by
+    the model.
+    """
+    try:
+        import vosk
+    except ImportError:
+        raise Exception(
+            "Vosk is required for the vosk engine, "
+            "install it with `pip install vosk`."
+        )
+
+    model_path = model or "model"
+    if not Path(model_path).exists():
+        raise Exception(
+            f"Vosk model not found at `{model_path}`. Download one from "
+            "https://alphacephei.com/vosk/models and unpack it as `model`, "
+            "or give its path with `--model`."
+        )
+
+    vosk_model = model_cache.get(
+        ("vosk", model_path),
+        lambda: vosk.Model(model_path),
+        lambda _: _directory_size(model_path),
+    )
+    # the recognizer keeps the decoding state, so it isn't shared
+    recognizer = vosk.KaldiRecognizer(vosk_model, VOSK_SAMPLE_RATE)
+    recognizer.AcceptWaveform(
+        audio_data.get_raw_data(convert_rate=VOSK_SAMPLE_RATE, convert_width=2)
+    )
+    return json.loads(recognizer.FinalResult())["text"]
+
+
+@register_recognizer_engine("whisper")
+def _recognize_whisper(
+    audio_data: sr.AudioData, language: str, model: str
+) -> str:
+    """
+    Recognize speech with a local Whisper model (by default, `base`).
+
+    The model keeps state in hooks while transcribing, so the calls on the
+    same model (e.g. from the threads of `convert_long_audio`) are
+    serialized by a lock kept with it in the cache.
+    """
+    try:
+        import whisper
+    except ImportError:
+        raise Exception(
+            "Whisper is required for the whisper engine, "
+            "install it with `pip install openai-whisper`."
+        )
+
+    model_name = model or "base"
+    whisper_model, lock = model_cache.get(
+        ("whisper", model_name),
+        lambda: (whisper.load_model(model_name), threading.Lock()),
+        lambda entry: sum(
+            p.numel() * p.element_size() for p in entry[0].parameters()
+        ),
+    )
+    samples = np.frombuffer(
+        audio_data.get_raw_data(
+            convert_rate=WHISPER_SAMPLE_RATE, convert_width=2
+        ),
+        dtype=np.int16,
+    )
+    with lock:
+        result = whisper_model.transcribe(
+            samples.astype(np.float32) / 32768,
+            # whisper expects a language code without the region, e.g. "en"
+            language=language.split("-", maxsplit=1)[0].lower(),
+            fp16=whisper_model.device.type == "cuda",
+        )
+    return result["text"].strip()
 
 
 class Speech(ArtBox, ABC):
@@ -34,10 +450,104 @@ class Speech(ArtBox, ABC):
 class SpeechFromTextEngineBase(Speech):
     """Set of methods for handing audio voices."""
 
+    # errors worth retrying when synthesizing the chunks of a long text
+    transient_errors: tuple[type[Exception], ...] = (
+        ConnectionError,
+        TimeoutError,
+    )
+
     def convert(self) -> None:
         """Convert text to audio speech."""
         ...
 
+    def cache_params(self) -> Optional[dict[str, str]]:
+        """
+        Return the arguments that determine the synthesized audio.
+
+        They are part of the cache key of the audio files. None means that
+        the output isn't deterministic, so it isn't cached.
+        """
+        return {"lang": self.args.get("lang", "en")}
+
+    async def select_voice(self) -> str:
+        """Return the voice used for all the chunks of a text."""
+        return self.args.get("voice", "")
+
+    @abstractmethod
+    async def synthesize_chunk(
+        self, text: str, voice: str
+    ) -> tuple[bytes, Optional[WordBoundaries]]:
+        """Synthesize a chunk of a long text into MP3 data and timings."""
+        ...
+
+    async def async_convert_long_text(self, text: str) -> None:
+        """
+        Convert a long text to audio speech, in chunks.
+
+        The text is split at paragraphs and sentences into chunks of at
+        most `chunk-size` characters, which are synthesized concurrently
+        (up to `concurrency` at a time) with the same voice. A chunk that
+        fails with a transient error is retried up to `retries` times.
+        The MP3 data of the chunks (and their timings, if the engine
+        gives them) is concatenated in order.
+        """
+        chunk_size = int(self.args.get("chunk-size") or 0)
+        concurrency = int(
+            self.args.get("concurrency") or DEFAULT_TTS_CONCURRENCY
+        )
+        retries = int(self.args.get("retries", TTS_RETRIES))
+
+        voice = await self.select_voice()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def synthesize(
+            chunk: str,
+        ) -> tuple[bytes, Optional[WordBoundaries]]:
+            attempt = 0
+            async with semaphore:
+                while True:
+                    try:
+                        return await self.synthesize_chunk(chunk, voice)
+                    except self.transient_errors:
+                        if attempt >= retries:
+                            raise
+                    await asyncio.sleep(TTS_RETRY_DELAY * 2**attempt)
+                    attempt += 1
+
+        results = await asyncio.gather(
+            *(synthesize(chunk) for chunk in split_text(text, chunk_size))
+        )
+        with open(self.output_path, "wb") as f:
+            for audio, _ in results:
+                f.write(audio)
+
+        timings = self.args.get("timings")
+        chunk_timings = [
+            boundaries for _, boundaries in results if boundaries is not None
+        ]
+        if timings and chunk_timings:
+            merged = WordBoundaries()
+            for boundaries in chunk_timings:
+                merged.extend(boundaries)
+            merged.save(timings_path(self.output_path, timings))
+
+    def convert_many(self, items: list[tuple[str, str]]) -> None:
+        """
+        Convert many text files to audio speech, one after another.
+
+        Parameters
+        ----------
+        items : list[tuple[str, str]]
+            Path of each text file and of its audio file.
+        """
+        for input_path, output_path in items:
+            args = {
+                **self.args,
+                "input-path": input_path,
+                "output-path": output_path,
+            }
+            type(self)(args).convert()
+
 
 class SpeechFromText(Speech):
     """Speech class will run commands according to the selected engine."""
@@ -61,13 +571,143 @@ class SpeechFromText(Speech):
             raise Exception(f"Engine {engine} not found.")
 
     def convert(self) -> None:
-        """Convert text to audio speech."""
-        return self.engine.convert()
+        """
+        Convert text to audio speech.
+
+        The audio files are cached on disk, keyed by the normalized text,
+        the engine and its parameters, see `cache_key`. A cached file is
+        served as a hard link (or a copy, across file systems), so the
+        output files shouldn't be modified in place. The argument
+        `cache-dir` sets the cache directory and `no-cache` disables it.
+        """
+        key = self.cache_key(self.args.get("input-path", ""))
+        if key and self._load_cached(key, self.output_path):
+            return
+
+        self._remove_outputs(self.output_path)
+        self.engine.convert()
+
+        if key:
+            self._save_cached(key, self.output_path)
+
+    def cache_key(self, input_path: str) -> Optional[str]:
+        """
+        Return the cache key of the audio of a text file.
+
+        Returns None when the cache is disabled or when the output isn't
+        deterministic (edge-tts without a fixed `voice`).
+        """
+        params = self.engine.cache_params()
+        if self.args.get("no-cache") or params is None or not input_path:
+            return None
+
+        with open(input_path, "r") as f:
+            text = normalize_text(f.read())
+
+        key = {
+            "engine": self.args.get("engine", "edge-tts"),
+            "chunk-size": int(self.args.get("chunk-size") or 0),
+            "params": params,
+            "text": text,
+        }
+        data = json.dumps(key, sort_keys=True).encode()
+        return hashlib.sha256(data).hexdigest()
+
+    def _cache_dir(self) -> Path:
+        return get_cache_dir("tts", self.args.get("cache-dir") or None)
+
+    def _output_files(self, output_path: Path) -> list[tuple[Path, str]]:
+        """Return the files written for an audio and their extension."""
+        files = [(output_path, ".mp3")]
+        timings = self.args.get("timings")
+        if timings:
+            files.append((timings_path(output_path, timings), f".{timings}"))
+        return files
+
+    def _load_cached(self, key: str, output_path: Path) -> bool:
+        """Place the cached audio at `output_path`, if there is any."""
+        cache_dir = self._cache_dir()
+        files = [
+            (cache_dir / f"{key}{suffix}", path)
+            for path, suffix in self._output_files(output_path)
+        ]
+        try:
+            for cache_path, _ in files:
+                touch(cache_path)
+            for cache_path, path in files:
+                link_or_copy(cache_path, path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _remove_outputs(self, output_path: Path) -> None:
+        """
+        Remove the files of a previous conversion to `output_path`.
+
+        They can be hard links to cache entries, which the engines would
+        truncate in place when writing the new audio.
+        """
+        for path, _ in self._output_files(output_path):
+            path.unlink(missing_ok=True)
+
+    def _save_cached(self, key: str, output_path: Path) -> None:
+        """Add a synthesized audio to the cache, evicting old entries."""
+        cache_dir = self._cache_dir()
+        for path, suffix in self._output_files(output_path):
+            link_or_copy(path, cache_dir / f"{key}{suffix}")
+        evict_lru(cache_dir, TTS_CACHE_MAX_BYTES)
+
+    def convert_batch(self) -> int:
+        """
+        Convert many text files to audio speech.
+
+        The argument `input-path` is a directory (walked recursively) or a
+        glob pattern, and `output-path` is the directory where the audio
+        files are saved, with the same name (and relative path, for a
+        directory) as the text files, but with the `.mp3` extension.
+
+        Returns
+        -------
+        int
+            Number of files converted.
+        """
+        items = [
+            (str(path), str(output_path))
+            for path, output_path in iter_batch_paths(
+                self.args.get("input-path", ""), self.output_path, ".mp3"
+            )
+        ]
+
+        pending = []
+        for input_path, output_path in items:
+            key = self.cache_key(input_path)
+            if key and self._load_cached(key, Path(output_path)):
+                continue
+            self._remove_outputs(Path(output_path))
+            pending.append((input_path, output_path, key))
+
+        self.engine.convert_many(
+            [
+                (input_path, output_path)
+                for input_path, output_path, _ in pending
+            ]
+        )
+
+        for _, output_path, key in pending:
+            if key:
+                self._save_cached(key, Path(output_path))
+        print(
+            f"{len(items)} texts have been converted to speech. "
+            f"Output saved at '{self.output_path}'."
+        )
+        return len(items)
 
 
 class SpeechEngineGTTS(SpeechFromTextEngineBase):
     """Google-Text-To-Speech engine."""
 
+    transient_errors = (gtts.gTTSError, requests.RequestException)
+
     def convert(self) -> None:
         """Convert text to audio speech."""
         title: str = self.args.get("title", "")
@@ -80,24 +720,152 @@ class SpeechEngineGTTS(SpeechFromTextEngineBase):
         if not input_path:
             raise Exception("Argument `input_path` not given")
 
+        if self.args.get("timings"):
+            raise Exception("gTTS doesn't give the timing of the words.")
+
         with open(input_path, "r") as f:
             text = f.read()
 
+        if self.args.get("chunk-size"):
+            asyncio.run(self.async_convert_long_text(text))
+            return
+
         tts = gtts.gTTS(text, lang=lang, slow=False)
         tts.save(str(self.output_path))
 
+    async def synthesize_chunk(
+        self, text: str, voice: str
+    ) -> tuple[bytes, Optional[WordBoundaries]]:
+        """Synthesize a chunk of a long text into MP3 data."""
+
+        def synthesize() -> bytes:
+            tts = gtts.gTTS(text, lang=self.args.get("lang", "en"), slow=False)
+            data = io.BytesIO()
+            tts.write_to_fp(data)
+            return data.getvalue()
+
+        return await asyncio.to_thread(synthesize), None
+
+
+@functools.lru_cache(maxsize=None)
+def _accepts_boundary(communicate_class: type) -> bool:
+    """Return True if `Communicate` has the `boundary` argument."""
+    return "boundary" in inspect.signature(communicate_class).parameters
+
 
 class SpeechEngineMSEdgeTTS(SpeechFromTextEngineBase):
     """Microsoft Edge Text-To-Speech engine."""
 
+    # client of the edge-tts service, it can be replaced by a local
+    # stand-in with the same interface (e.g. in the tests)
+    communicate_class: type = edge_tts.Communicate
+
+    transient_errors = (
+        aiohttp.ClientError,
+        asyncio.TimeoutError,
+        NoAudioReceived,
+        WebSocketError,
+    )
+
+    def cache_params(self) -> Optional[dict[str, str]]:
+        """Return the arguments that determine the synthesized audio."""
+        # without a fixed voice, a random one is chosen for each call
+        if not self.args.get("voice"):
+            return None
+        return {
+            "lang": self.args.get("lang", "en"),
+            "voice": self.args.get("voice", ""),
+            "rate": self.args.get("rate", "+0%"),
+            "volume": self.args.get("volume", "+0%"),
+            "pitch": self.args.get("pitch", "+0Hz"),
+        }
+
+    async def select_voice(self) -> str:
+        """Return the `voice` argument or a random voice for `lang`."""
+        voice: str = self.args.get("voice", "")
+        if voice:
+            return voice
+
+        lang: str = self.args.get("lang", "en")
+        params = {"Locale": lang} if "-" in lang else {"Language": lang}
+        voices = await get_voices_manager()
+        voice_options = voices.find(Gender="Female", **params)
+        if not voice_options:
+            raise Exception(f"No voice found for the language `{lang}`.")
+        return random.choice(voice_options)["Name"]
+
+    async def synthesize(
+        self,
+        text: str,
+        file: BinaryIO,
+        voice: str,
+        boundaries: Optional[WordBoundaries] = None,
+    ) -> None:
+        """
+        Synthesize a text with the given voice, writing it to a file.
+
+        If `boundaries` is given, the timing of each word is added to it.
+        """
+        kwargs = {}
+        if boundaries is not None and _accepts_boundary(
+            self.communicate_class
+        ):
+            # edge-tts 6 always sends the word boundaries, but edge-tts 7
+            # sends the sentence boundaries by default
+            kwargs["boundary"] = "WordBoundary"
+        communicate = self.communicate_class(
+            text=text,
+            voice=voice,
+            rate=self.args.get("rate", "+0%"),
+            volume=self.args.get("volume", "+0%"),
+            pitch=self.args.get("pitch", "+0Hz"),
+            **kwargs,
+        )
+        n_bytes = 0
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                file.write(chunk["data"])
+                n_bytes += len(chunk["data"])
+            elif chunk["type"] == "WordBoundary" and boundaries is not None:
+                boundaries.append(
+                    chunk["offset"], chunk["duration"], chunk["text"]
+                )
+
+        if boundaries is not None:
+            boundaries.audio_duration = (
+                n_bytes * 8 * TICKS_PER_SECOND // EDGE_TTS_BITRATE
+            )
+
+    async def synthesize_file(
+        self, text: str, output_path: Path, voice: str
+    ) -> None:
+        """
+        Synthesize a text into an audio file.
+
+        If the argument `timings` is given (`srt` or `json`), the timing of
+        the words is saved next to the audio file, with that extension.
+        """
+        timings = self.args.get("timings")
+        sidecar_path = timings_path(output_path, timings) if timings else None
+        boundaries = WordBoundaries() if timings else None
+        with open(output_path, "wb") as file:
+            await self.synthesize(text, file, voice, boundaries)
+        if boundaries is not None and sidecar_path is not None:
+            boundaries.save(sidecar_path)
+
+    async def synthesize_chunk(
+        self, text: str, voice: str
+    ) -> tuple[bytes, Optional[WordBoundaries]]:
+        """Synthesize a chunk of a long text into MP3 data and timings."""
+        data = io.BytesIO()
+        boundaries = WordBoundaries() if self.args.get("timings") else None
+        await self.synthesize(text, data, voice, boundaries)
+        return data.getvalue(), boundaries
+
     async def async_convert(self) -> None:
         """Convert text to audio speech in async mode."""
         title: str = self.args.get("title", "")
         input_path: str = self.args.get("input-path", "")
-        lang: str = self.args.get("lang", "en")
-        rate = self.args.get("rate", "+0%")
-        volume = self.args.get("volume", "+0%")
-        pitch = self.args.get("pitch", "+0Hz")
 
         if not title:
             raise Exception("Argument `title` not given")
@@ -108,110 +876,212 @@ class SpeechEngineMSEdgeTTS(SpeechFromTextEngineBase):
         with open(input_path, "r") as f:
             text = f.read()
 
-        params = {"Locale": lang} if "-" in lang else {"Language": lang}
-        voices = await VoicesManager.create()
-        voice_options = voices.find(Gender="Female", **params)
+        if self.args.get("chunk-size"):
+            await self.async_convert_long_text(text)
+            return
 
-        communicate = edge_tts.Communicate(
-            text=text,
-            voice=random.choice(voice_options)["Name"],
-            rate=rate,
-            volume=volume,
-            pitch=pitch,
+        voice = await self.select_voice()
+        await self.synthesize_file(text, self.output_path, voice)
+
+    async def async_convert_many(self, items: list[tuple[str, str]]) -> None:
+        """
+        Convert many text files to audio speech concurrently.
+
+        At most `concurrency` files are synthesized at the same time, all
+        in the current event loop and sharing the cached voice list. A
+        failure doesn't stop the other files; the failures are reported
+        together at the end.
+
+        Parameters
+        ----------
+        items : list[tuple[str, str]]
+            Path of each text file and of its audio file.
+        """
+        concurrency = int(
+            self.args.get("concurrency") or DEFAULT_TTS_CONCURRENCY
         )
-        with open(self.output_path, "wb") as file:
-            async for chunk in communicate.stream():
-                if chunk["type"] == "audio":
-                    file.write(chunk["data"])
-                elif chunk["type"] == "WordBoundary":
-                    print(f"WordBoundary: {chunk}")
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def convert_one(input_path: str, output_path: str) -> None:
+            async with semaphore:
+                with open(input_path, "r") as f:
+                    text = f.read()
+                voice = await self.select_voice()
+                await self.synthesize_file(text, Path(output_path), voice)
+
+        if items and not self.args.get("voice"):
+            # fetch the voice list once, instead of in every coroutine
+            await get_voices_manager()
+
+        results = await asyncio.gather(
+            *(convert_one(*item) for item in items), return_exceptions=True
+        )
+        errors = [
+            f"{input_path}: {result}"
+            for (input_path, _), result in zip(items, results)
+            if isinstance(result, BaseException)
+        ]
+        if errors:
+            raise Exception(
+                f"{len(errors)} of {len(items)} texts failed:\n"
+                + "\n".join(errors)
+            )
 
     def convert(self) -> None:
         """Convert text to audio speech."""
-        loop = asyncio.get_event_loop_policy().get_event_loop()
-        try:
-            loop.run_until_complete(self.async_convert())
-        finally:
-            loop.close()
+        asyncio.run(self.async_convert())
+
+    def convert_many(self, items: list[tuple[str, str]]) -> None:
+        """Convert many text files to audio speech concurrently."""
+        asyncio.run(self.async_convert_many(items))
 
 
 class SpeechToText(Speech):
     """Speech to Text class."""
 
     def convert(self) -> None:
-        """Recognize speech from MP# using various engines options."""
-        file_path: str = str(self.input_path)
-
-        if file_path.endswith("mp3"):
-            self.convert_from_mp3()
+        """Recognize speech from audio using various engines options."""
+        if self.args.get("chunk-duration"):
+            self.convert_long_audio(
+                decode_audio(str(self.input_path), LONG_AUDIO_SAMPLE_RATE)
+            )
             return
 
-        if file_path.endswith("wav"):
+        if self.input_path.suffix.lower() == ".wav":
             self.convert_from_wav()
             return
 
-        raise Exception(
-            "The file format is not valid. Valid types are mp3 and wav."
-        )
+        self.convert_from_mp3()
 
     def convert_from_mp3(self) -> None:
-        """Recognize speech from MP# using various engines options."""
-        file_path: Path = self.input_path
-
-        # Convert MP3 to WAV
-        wav_path = str(file_path).replace(".mp3", ".wav")
-        convert_mp3_to_wav(str(file_path), wav_path)
-
-        self.input_path = Path(wav_path)
-        self.convert_from_wav()
+        """
+        Recognize speech from MP3 using various engines options.
 
-        # Cleanup: Remove the WAV file
-        os.remove(wav_path)
+        The audio is decoded in memory, so any format that ffmpeg can
+        decode is supported, and no temporary file is written.
+        """
+        self.convert_from_audio(decode_audio(str(self.input_path)))
 
     def convert_from_wav(self) -> None:
         """Recognize speech from WAVE using various engines options."""
         wav_path: str = str(self.input_path)
-        output_path: str = str(self.output_path)
+
+        with sr.AudioFile(wav_path) as source:
+            audio_data = sr.Recognizer().record(source)
+
+        self._write_text(self.recognize(audio_data))
+
+    def convert_from_audio(self, audio: AudioBuffer) -> None:
+        """
+        Recognize speech from audio already decoded in memory.
+
+        Parameters
+        ----------
+        audio : AudioBuffer
+            The decoded audio, e.g. from a previous stage of a pipeline.
+        """
+        mono = AudioBuffer(audio.to_mono(), audio.sample_rate)
+        audio_data = sr.AudioData(
+            mono.to_int16().tobytes(), mono.sample_rate, 2
+        )
+        self._write_text(self.recognize(audio_data))
+
+    def convert_long_audio(
+        self, audio: AudioBuffer
+    ) -> list[tuple[float, float, str]]:
+        """
+        Recognize speech from a long audio, split into chunks.
+
+        The audio is split at silences into chunks of at most
+        `chunk-duration` seconds, which are recognized concurrently by
+        `workers` threads (by default, the number of CPU cores). This is
+        meant for the offline engines (`vosk` and `whisper`), whose models
+        run locally. The text is written to the output file; if it ends in
+        `.srt` or `.json`, the timestamp of each chunk is saved too.
+
+        Parameters
+        ----------
+        audio : AudioBuffer
+            The decoded audio.
+
+        Returns
+        -------
+        list[tuple[float, float, str]]
+            Start, end (in seconds) and text of each chunk.
+        """
+        chunk_duration = float(self.args.get("chunk-duration") or 30)
+        workers = int(self.args.get("workers") or 0) or os.cpu_count() or 1
+
+        samples = audio.to_mono()
+        sample_rate = audio.sample_rate
+
+        def transcribe(span: tuple[int, int]) -> tuple[float, float, str]:
+            start, end = span
+            chunk = AudioBuffer(samples[start:end], sample_rate)
+            audio_data = sr.AudioData(
+                chunk.to_int16().tobytes(), sample_rate, 2
+            )
+            text = self.recognize(audio_data, allow_empty=True)
+            return start / sample_rate, end / sample_rate, text.strip()
+
+        spans = split_on_silence(samples, sample_rate, chunk_duration)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            segments = [
+                segment
+                for segment in executor.map(transcribe, spans)
+                if segment[2]
+            ]
+
+        suffix = self.output_path.suffix.lower()
+        if suffix == ".srt":
+            self._write_text(segments_to_srt(segments))
+        elif suffix == ".json":
+            self._write_text(
+                json.dumps(
+                    [
+                        {"start": start, "end": end, "text": text}
+                        for start, end, text in segments
+                    ],
+                    indent=2,
+                )
+            )
+        else:
+            self._write_text(" ".join(text for _, _, text in segments))
+        return segments
+
+    def recognize(
+        self, audio_data: sr.AudioData, allow_empty: bool = False
+    ) -> str:
+        """
+        Recognize the speech from audio data with the selected engine.
+
+        The engines are looked up in `RECOGNIZER_ENGINES`. The local models
+        (`vosk` and `whisper`, chosen with the `model` argument) are loaded
+        once per process and kept in `model_cache`.
+
+        When `allow_empty` is True, an audio without recognizable speech
+        (e.g. a silent chunk) returns an empty string instead of failing.
+        """
         language: str = self.args.get("lang", "en-US")
         engine: str = self.args.get("engine", "google")
+        model: str = self.args.get("model", "")
 
-        # Initialize recognizer
-        recognizer = sr.Recognizer()
+        if engine not in RECOGNIZER_ENGINES:
+            raise Exception(f"Engine '{engine}' is not supported.")
 
-        with sr.AudioFile(wav_path) as source:
-            audio_data = recognizer.record(source)
-            kwargs = {"audio_data": audio_data, "language": language}
-            try:
-                if engine == "google":
-                    text = recognizer.recognize_google(**kwargs)
-                elif engine == "google_cloud":
-                    text = recognizer.recognize_google_cloud(**kwargs)
-                elif engine == "wit":
-                    text = recognizer.recognize_wit(**kwargs)
-                elif engine == "azure":
-                    text = recognizer.recognize_azure(**kwargs)
-                elif engine == "houndify":
-                    text = recognizer.recognize_houndify(**kwargs)
-                elif engine == "ibm":
-                    text = recognizer.recognize_ibm(**kwargs)
-                elif engine == "vosk":
-                    text = recognizer.recognize_vosk(**kwargs)
-                elif engine == "whisper":
-                    text = recognizer.recognize_whisper(**kwargs)
-                elif engine == "whisper-api":
-                    text = recognizer.recognize_whisper_api(
-                        kwargs.get("audio_data")
-                    )
-                else:
-                    raise Exception(f"Engine '{engine}' is not supported.")
-            except sr.UnknownValueError:
-                raise Exception(
-                    f"{engine.title()} could not understand the audio"
-                )
-            except sr.RequestError as e:
-                raise Exception(
-                    f"Could not request results from {engine.title()}; {e}"
-                )
+        try:
+            text = RECOGNIZER_ENGINES[engine](audio_data, language, model)
+        except sr.UnknownValueError:
+            if allow_empty:
+                return ""
+            raise Exception(f"{engine.title()} could not understand the audio")
+        except sr.RequestError as e:
+            raise Exception(
+                f"Could not request results from {engine.title()}; {e}"
+            )
+        return text
 
-        with open(output_path, "w") as f:
+    def _write_text(self, text: str) -> None:
+        """Write the recognized text to the output file."""
+        with open(str(self.output_path), "w") as f:
             f.write(text)
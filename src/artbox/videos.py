@@ -1,17 +1,191 @@
 """
 Set of tools for video handling.
 
+moviepy and pytubefix are slow to import, and they are only needed for
+re-encoding and for YouTube, so they are imported by the methods that use
+them.
+
 ref: https://github.com/ethand91/python-youtube/blob/master/main.py
 """
 
+import json
+import os
+
 from abc import abstractmethod
+from concurrent.futures import (
+    ALL_COMPLETED,
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Optional
 
 import ffmpeg
 
-from moviepy.editor import AudioFileClip, VideoFileClip
-from pytubefix import YouTube as PyYouTube
+from artbox.audio import AudioBuffer, decode_audio
+from artbox.base import ArtBox, iter_input_paths
+from artbox.cache import file_stat_key, get_cache_dir, write_atomic
+
+AUDIO_FADE_DURATION = 5
+
+# video codecs that can be stream-copied into each output container,
+# `None` means that the container accepts any codec
+STREAM_COPY_VIDEO_CODECS: dict[str, Optional[set[str]]] = {
+    ".mp4": {"h264", "hevc", "mpeg4", "av1", "vp9"},
+    ".m4v": {"h264", "hevc", "mpeg4"},
+    ".mov": {"h264", "hevc", "mpeg4", "mjpeg", "prores"},
+    ".mkv": None,
+}
+
+# audio codecs that can be copied into each output format without
+# transcoding, `None` means that the format accepts any codec
+STREAM_COPY_AUDIO_CODECS: dict[str, Optional[set[str]]] = {
+    ".mp3": {"mp3"},
+    ".aac": {"aac"},
+    ".m4a": {"aac", "alac"},
+    ".ogg": {"vorbis", "opus", "flac"},
+    ".opus": {"opus"},
+    ".flac": {"flac"},
+    ".wav": {"pcm_s16le", "pcm_s24le", "pcm_s32le", "pcm_f32le", "pcm_u8"},
+    ".mka": None,
+}
+
+
+def _get_stream(probe: dict, codec_type: str) -> Optional[dict]:
+    """Return the first stream of the given type from a ffmpeg probe."""
+    for stream in probe.get("streams", []):
+        if stream.get("codec_type") == codec_type:
+            return stream
+    return None
+
+
+def _run_ffmpeg(stream) -> None:
+    """Run a ffmpeg-python stream, overwriting the output file."""
+    try:
+        stream.overwrite_output().global_args("-nostdin").run(
+            capture_stdout=True, capture_stderr=True
+        )
+    except ffmpeg.Error as e:
+        raise Exception(f"ffmpeg failed: {e.stderr.decode(errors='ignore')}")
+
+
+@dataclass
+class StreamMetadata:
+    """Metadata of a stream (video, audio, subtitle, etc) of a media file."""
+
+    index: Optional[int] = None
+    type: Optional[str] = None
+    codec: Optional[str] = None
+    profile: Optional[str] = None
+    resolution: Optional[str] = None
+    bit_rate: Optional[str] = None
+    sample_rate: Optional[str] = None
+    channels: Optional[int] = None
+    tags: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_probe(cls, stream: dict[str, Any]) -> "StreamMetadata":
+        """Create the stream metadata from a ffmpeg probe stream."""
+        codec_type = stream.get("codec_type")
+        is_audio = codec_type == "audio"
+        return cls(
+            index=stream.get("index"),
+            type=codec_type,
+            codec=stream.get("codec_name"),
+            profile=stream.get("profile"),
+            resolution=(
+                f"{stream.get('width')}x{stream.get('height')}"
+                if codec_type == "video"
+                else None
+            ),
+            bit_rate=stream.get("bit_rate"),
+            sample_rate=stream.get("sample_rate") if is_audio else None,
+            channels=stream.get("channels") if is_audio else None,
+            tags=stream.get("tags", {}),
+        )
+
+
+@dataclass
+class VideoMetadata:
+    """Metadata of a media file."""
+
+    format: Optional[str] = None
+    duration: Optional[str] = None
+    size: Optional[str] = None
+    bit_rate: Optional[str] = None
+    tags: dict[str, str] = field(default_factory=dict)
+    streams: list[StreamMetadata] = field(default_factory=list)
+
+    @classmethod
+    def from_probe(cls, probe: dict[str, Any]) -> "VideoMetadata":
+        """Create the metadata from the result of `ffmpeg.probe`."""
+        general_metadata = probe.get("format", {})
+        return cls(
+            format=general_metadata.get("format_name"),
+            duration=general_metadata.get("duration"),
+            size=general_metadata.get("size"),
+            bit_rate=general_metadata.get("bit_rate"),
+            tags=general_metadata.get("tags", {}),
+            streams=[
+                StreamMetadata.from_probe(stream)
+                for stream in probe.get("streams", [])
+            ],
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "VideoMetadata":
+        """Create the metadata from the output of `to_dict`."""
+        streams = [StreamMetadata(**stream) for stream in data["streams"]]
+        return cls(**{**data, "streams": streams})
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the metadata as a dictionary."""
+        return asdict(self)
+
+    def to_json(self, **kwargs: Any) -> str:
+        """Return the metadata serialized as JSON."""
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+def probe_metadata(
+    file_path: str, cache_dir: Optional[str] = None, use_cache: bool = True
+) -> VideoMetadata:
+    """
+    Probe the metadata of a media file.
+
+    The result is cached on disk, keyed by the path, size and modification
+    time of the file, so probing the same file again doesn't run ffprobe.
+
+    Parameters
+    ----------
+    file_path : str
+        Path of the media file.
+    cache_dir : str, optional
+        Root directory of the caches, see `artbox.cache.get_cache_dir`.
+    use_cache : bool
+        If False, the file is always probed and the cache is not updated.
+
+    Returns
+    -------
+    VideoMetadata
+        The metadata of the file.
+    """
+    if not use_cache:
+        return VideoMetadata.from_probe(ffmpeg.probe(file_path))
 
-from artbox.base import ArtBox
+    cache_path = (
+        get_cache_dir("metadata", cache_dir)
+        / f"{file_stat_key(file_path)}.json"
+    )
+    if cache_path.exists():
+        with open(cache_path, "r") as f:
+            return VideoMetadata.from_dict(json.load(f))
+
+    metadata = VideoMetadata.from_probe(ffmpeg.probe(file_path))
+    write_atomic(cache_path, metadata.to_json().encode())
+    return metadata
 
 
 class DownloadBase(ArtBox):
@@ -49,6 +223,8 @@ class Youtube(DownloadBase):
 
     def download(self):
         """Download a youtube video."""
+        from pytubefix import YouTube as PyYouTube
+
         resolution = self.args.get("resolution", "")
         video_url = self.args.get("url", "")
 
@@ -78,6 +254,8 @@ class Youtube(DownloadBase):
 
     def download_captions(self):
         """Download the English closed captions of a YouTube video."""
+        from pytubefix import YouTube as PyYouTube
+
         video_url = self.args.get("url", "")
         lang = self.args.get("lang", "en")
         format = self.args.get("format", "text")
@@ -108,6 +286,10 @@ class Video(ArtBox):
         The result will be clipped to the time of the shorter input
         (video or audio), and the audio will fade out smoothly over the last
         5 seconds.
+
+        The video stream is copied without re-encoding when the output
+        container supports its codec, otherwise (or when the argument
+        `reencode` is set) the video is re-encoded with libx264.
         """
         video_path = self.args.get("video-path", "")
         audio_path = self.args.get("audio-path", "")
@@ -119,6 +301,60 @@ class Video(ArtBox):
         if not audio_path:
             raise Exception("Argument `audio-path` not given.")
 
+        video_probe = ffmpeg.probe(video_path)
+        video_stream = _get_stream(video_probe, "video")
+        if video_stream is None:
+            raise Exception(f"No video stream found in `{video_path}`.")
+
+        allowed_codecs = STREAM_COPY_VIDEO_CODECS.get(
+            Path(output_path).suffix.lower(), set()
+        )
+        can_copy = (
+            allowed_codecs is None
+            or video_stream.get("codec_name") in allowed_codecs
+        )
+
+        if self.args.get("reencode") or not can_copy:
+            self._combine_video_and_audio_reencoding(
+                video_path, audio_path, output_path
+            )
+            return
+
+        audio_probe = ffmpeg.probe(audio_path)
+
+        # Determine the shorter duration of the two inputs
+        min_duration = min(
+            float(video_probe["format"]["duration"]),
+            float(audio_probe["format"]["duration"]),
+        )
+        fade_duration = min(AUDIO_FADE_DURATION, min_duration)
+
+        video = ffmpeg.input(video_path).video
+        audio = ffmpeg.input(audio_path).audio.filter(
+            "afade",
+            type="out",
+            start_time=min_duration - fade_duration,
+            duration=fade_duration,
+        )
+
+        # Copy the video bitstream and encode only the audio
+        _run_ffmpeg(
+            ffmpeg.output(
+                video,
+                audio,
+                output_path,
+                vcodec="copy",
+                acodec="aac",
+                t=min_duration,
+            )
+        )
+
+    def _combine_video_and_audio_reencoding(
+        self, video_path: str, audio_path: str, output_path: str
+    ) -> None:
+        """Combine video and audio files re-encoding the video."""
+        from moviepy.editor import AudioFileClip, VideoFileClip
+
         # Load the video (without audio) from the MP4 file
         video_clip = VideoFileClip(video_path)
         video_clip = video_clip.without_audio()
@@ -134,7 +370,7 @@ class Video(ArtBox):
         audio_clip = audio_clip.subclip(0, min_duration)
 
         # Apply a 5-second fade-out effect to the audio
-        audio_clip = audio_clip.audio_fadeout(5)
+        audio_clip = audio_clip.audio_fadeout(AUDIO_FADE_DURATION)
 
         # Set the audio of the video clip
         final_clip = video_clip.set_audio(audio_clip)
@@ -148,21 +384,76 @@ class Video(ArtBox):
         final_clip.close()
 
     def extract_audio(self) -> None:
-        """Extract audio from an MP4 file."""
+        """
+        Extract audio from an MP4 file.
+
+        The audio stream is copied as it is when its codec is compatible
+        with the output format, otherwise it is transcoded according to the
+        output file extension. The arguments `bitrate` (e.g. "192k") and
+        `sample-rate` are used for the transcoding.
+        """
         video_path = str(self.input_path)
         output_path = str(self.output_path)
+        bitrate = self.args.get("bitrate", "")
+        sample_rate = self.args.get("sample-rate", "")
+
+        audio_stream = _get_stream(ffmpeg.probe(video_path), "audio")
+        if audio_stream is None:
+            raise Exception(f"No audio stream found in `{video_path}`.")
+
+        allowed_codecs = STREAM_COPY_AUDIO_CODECS.get(
+            Path(output_path).suffix.lower(), set()
+        )
+        can_copy = (
+            allowed_codecs is None
+            or audio_stream.get("codec_name") in allowed_codecs
+        )
+
+        output_args: dict[str, str] = {}
+        if can_copy and not bitrate and not sample_rate:
+            output_args["acodec"] = "copy"
+        else:
+            if bitrate:
+                output_args["audio_bitrate"] = bitrate
+            if sample_rate:
+                output_args["ar"] = sample_rate
 
-        video_clip = VideoFileClip(video_path)
-        audio_clip = video_clip.audio
-        audio_clip.write_audiofile(output_path)
-        audio_clip.close()
-        video_clip.reader.close()
+        _run_ffmpeg(
+            ffmpeg.input(video_path).output(
+                output_path, vn=None, **output_args
+            )
+        )
 
         print(f"Audio has been extracted. Output saved at '{output_path}'.")
 
-    def get_metadata(self) -> None:
+    def extract_audio_buffer(
+        self, sample_rate: Optional[int] = None, channels: int = 1
+    ) -> AudioBuffer:
+        """
+        Decode the audio of a video file into memory.
+
+        Parameters
+        ----------
+        sample_rate : int, optional
+            Resample the audio to this rate. By default, the original sample
+            rate is kept.
+        channels : int
+            Number of channels of the decoded audio.
+
+        Returns
+        -------
+        AudioBuffer
+            The decoded audio.
+        """
+        return decode_audio(str(self.input_path), sample_rate, channels)
+
+    def get_metadata(self) -> VideoMetadata:
         """
-        Extract metadata from an MP4 file using moviepy.
+        Extract metadata from an MP4 file and save it as JSON.
+
+        The probe results are cached on disk, see `probe_metadata`. The
+        argument `cache-dir` sets the cache directory and `no-cache`
+        disables the cache.
 
         Returns
         -------
@@ -171,56 +462,110 @@ class Video(ArtBox):
         file_path = str(self.input_path)
 
         try:
-            probe = ffmpeg.probe(file_path)
-            general_metadata = probe.get("format", {})
-            streams_metadata = probe.get("streams", [])
-
-            detailed_metadata = {
-                "format": general_metadata.get("format_name"),
-                "duration": general_metadata.get("duration"),
-                "size": general_metadata.get("size"),
-                "bit_rate": general_metadata.get("bit_rate"),
-                "tags": general_metadata.get("tags", {}),
-                "streams": [],
-            }
-
-            for stream in streams_metadata:
-                stream_info = {
-                    "index": stream.get("index"),
-                    "type": stream.get("codec_type"),
-                    "codec": stream.get("codec_name"),
-                    "profile": stream.get("profile"),
-                    "resolution": (
-                        f"{stream.get('width')}x{stream.get('height')}"
-                        if stream.get("codec_type") == "video"
-                        else None
-                    ),
-                    "bit_rate": stream.get("bit_rate"),
-                    "sample_rate": stream.get("sample_rate")
-                    if stream.get("codec_type") == "audio"
-                    else None,
-                    "channels": stream.get("channels")
-                    if stream.get("codec_type") == "audio"
-                    else None,
-                    "tags": stream.get("tags", {}),
-                }
-                detailed_metadata["streams"].append(stream_info)
-
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            return
+            metadata = probe_metadata(
+                file_path,
+                cache_dir=self.args.get("cache-dir") or None,
+                use_cache=not self.args.get("no-cache"),
+            )
+        except ffmpeg.Error as e:
+            raise Exception(
+                f"ffprobe could not read `{file_path}`: "
+                f"{e.stderr.decode(errors='ignore')}"
+            )
 
         with open(self.output_path, "w") as f:
-            f.write(str(detailed_metadata))
-        print(detailed_metadata)
+            f.write(metadata.to_json(indent=2))
+
+        print(
+            "Metadata has been extracted. "
+            f"Output saved at '{self.output_path}'."
+        )
+        return metadata
+
+    def get_metadata_batch(self) -> int:
+        """
+        Extract the metadata of many files into a JSON Lines file.
+
+        The argument `input-path` is a directory or a glob pattern. The
+        files are probed concurrently by a pool of `workers` threads, and
+        each result is written as soon as it is ready, as a line with the
+        keys `path` and `metadata` (or `error`, if the probe failed).
+
+        Returns
+        -------
+        int
+            Number of files processed.
+        """
+        workers = int(self.args.get("workers") or 0) or min(
+            32, (os.cpu_count() or 1) + 4
+        )
+        cache_dir = self.args.get("cache-dir") or None
+        use_cache = not self.args.get("no-cache")
+
+        def probe(path: Path) -> dict[str, Any]:
+            try:
+                metadata = probe_metadata(str(path), cache_dir, use_cache)
+            except Exception as e:
+                return {"path": str(path), "error": str(e)}
+            return {"path": str(path), "metadata": metadata.to_dict()}
+
+        n_files = 0
+        with (
+            ThreadPoolExecutor(max_workers=workers) as executor,
+            open(self.output_path, "w") as f,
+        ):
+            # bound the number of pending tasks
+            max_pending = workers * 4
+            pending: set = set()
+
+            def write_done(return_when: str) -> None:
+                nonlocal pending
+                done, pending = wait(pending, return_when=return_when)
+                for future in done:
+                    f.write(json.dumps(future.result()) + "\n")
+                f.flush()
+
+            for path in iter_input_paths(str(self.input_path)):
+                if len(pending) >= max_pending:
+                    write_done(FIRST_COMPLETED)
+                pending.add(executor.submit(probe, path))
+                n_files += 1
+
+            if pending:
+                write_done(ALL_COMPLETED)
+
+        print(
+            f"Metadata of {n_files} files has been extracted. "
+            f"Output saved at '{self.output_path}'."
+        )
+        return n_files
 
     def remove_audio(self) -> None:
-        """Remove the audio from an MP4 file."""
-        # Load the video
-        video = VideoFileClip(str(self.input_path))
+        """
+        Remove the audio from an MP4 file.
 
-        # Set the audio track to None
-        video = video.set_audio(None)
+        By default, the video stream is copied as it is. If the argument
+        `codec` is given, the video is re-encoded with that codec.
+        """
+        input_path = str(self.input_path)
+        output_path = str(self.output_path)
+        codec = self.args.get("codec", "")
 
-        # Write the result to a file
-        video.write_videofile(str(self.output_path), codec="libx264")
+        if not codec:
+            _run_ffmpeg(
+                ffmpeg.input(input_path).output(
+                    output_path, an=None, vcodec="copy"
+                )
+            )
+            return
+
+        from moviepy.editor import VideoFileClip
+
+        # Load the video
+        video = VideoFileClip(input_path)
+
+        try:
+            # Set the audio track to None and write the result to a file
+            video.without_audio().write_videofile(output_path, codec=codec)
+        finally:
+            video.close()
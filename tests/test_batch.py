@@ -0,0 +1,83 @@
+"""Set of tests for the batch module."""
+
+import json
+
+from pathlib import Path
+
+from artbox.batch import Batch
+
+TEST_DATA_DIR = Path(__file__).parent / "data"
+
+
+def test_batch_run(tmp_path):
+    """Test running a manifest with successful and failing tasks."""
+    notes_path = str(TEST_DATA_DIR / "notes" / "set1.txt")
+    tasks = [
+        {
+            "id": f"melody-{i}",
+            "operation": "sound notes-to-audio",
+            "args": {
+                "input-path": notes_path,
+                "output-path": str(tmp_path / f"melody-{i}.mp3"),
+                "duration": 1,
+            },
+        }
+        for i in range(3)
+    ]
+    tasks.append(
+        {
+            "id": "metadata",
+            "operation": "video get-metadata",
+            "args": {
+                "input-path": str(TEST_DATA_DIR / "audios" / "speech.mp3"),
+                "output-path": str(tmp_path / "speech.json"),
+                "no-cache": True,
+            },
+        }
+    )
+    tasks.append(
+        {
+            "id": "missing-metadata",
+            "operation": "video get-metadata",
+            "args": {
+                "input-path": str(tmp_path / "missing.mp4"),
+                "output-path": str(tmp_path / "missing.json"),
+                "no-cache": True,
+            },
+        }
+    )
+    tasks.append({"id": "unknown", "operation": "sound unknown"})
+    tasks.append(
+        {
+            "id": "no-duration",
+            "operation": "sound notes-to-audio",
+            "args": {"input-path": notes_path},
+        }
+    )
+
+    manifest_path = tmp_path / "manifest.jsonl"
+    with open(manifest_path, "w") as f:
+        f.writelines(json.dumps(task) + "\n" for task in tasks)
+
+    results_path = tmp_path / "results.jsonl"
+    params = {
+        "input-path": manifest_path,
+        "output-path": results_path,
+        "workers": 2,
+    }
+    summary = Batch(params).run()
+    assert summary == {"ok": 4, "error": 3}
+
+    with open(results_path, "r") as f:
+        results = {result["id"]: result for result in map(json.loads, f)}
+
+    assert results["melody-2"]["index"] == 2  # noqa: PLR2004
+    assert results["melody-2"]["status"] == "ok"
+    assert results["melody-2"]["duration"] > 0
+    assert (tmp_path / "melody-2.mp3").exists()
+    assert (tmp_path / "speech.json").exists()
+    assert results["unknown"]["status"] == "error"
+    assert "not found" in results["unknown"]["error"]
+    assert "duration" in results["no-duration"]["error"]
+    assert results["missing-metadata"]["status"] == "error"
+    assert "missing.mp4" in results["missing-metadata"]["error"]
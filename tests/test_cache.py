@@ -0,0 +1,45 @@
+"""Set of tests for the cache module."""
+
+import os
+
+from artbox.cache import evict_lru, file_content_hash, link_or_copy, touch
+
+
+def test_evict_lru(tmp_path) -> None:
+    """Test that the least recently used files are removed first."""
+    for i, name in enumerate(("a", "b", "c")):
+        path = tmp_path / name
+        path.write_bytes(b"x" * 10)
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+    (tmp_path / ".d.tmp").write_bytes(b"x" * 100)
+
+    touch(tmp_path / "a")
+    evict_lru(tmp_path, max_bytes=20)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".d.tmp", "a", "c"]
+
+
+def test_link_or_copy(tmp_path) -> None:
+    """Test that the target is replaced by a hard link to the source."""
+    source = tmp_path / "source"
+    source.write_text("new")
+    target = tmp_path / "target"
+    target.write_text("old")
+
+    link_or_copy(source, target)
+
+    assert target.read_text() == "new"
+    assert target.stat().st_ino == source.stat().st_ino
+
+
+def test_file_content_hash(tmp_path) -> None:
+    """Test that the hash depends only on the content of the file."""
+    first = tmp_path / "first"
+    first.write_text("audio")
+    second = tmp_path / "second"
+    second.write_text("audio")
+
+    assert file_content_hash(str(first)) == file_content_hash(str(second))
+
+    second.write_text("other audio")
+    assert file_content_hash(str(first)) != file_content_hash(str(second))
@@ -0,0 +1,59 @@
+"""Set of tests for the cli module."""
+
+import subprocess
+import sys
+
+from typer.testing import CliRunner
+
+from artbox import __version__
+from artbox.cli import app
+
+# budget for `import artbox.cli`, in microseconds
+IMPORT_TIME_BUDGET = 500_000
+
+HEAVY_MODULES = (
+    "aubio",
+    "edge_tts",
+    "gtts",
+    "librosa",
+    "matplotlib",
+    "moviepy",
+    "noisereduce",
+    "pytubefix",
+    "speech_recognition",
+)
+
+
+def _import_times(module: str) -> dict[str, int]:
+    """Return the cumulative import time of each module imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_time():
+    """Test that the cli doesn't import heavy dependencies on startup."""
+    times = _import_times("artbox.cli")
+
+    imported_heavy = [
+        name for name in times if name.split(".")[0] in HEAVY_MODULES
+    ]
+    assert not imported_heavy
+    assert times["artbox.cli"] < IMPORT_TIME_BUDGET
+
+
+def test_cli_version():
+    """Test the version flag."""
+    result = CliRunner().invoke(app, ["--version"])
+    assert result.exit_code == 0
+    assert __version__ in result.stdout
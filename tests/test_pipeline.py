@@ -0,0 +1,38 @@
+"""Set of tests for the pipeline module."""
+
+from pathlib import Path
+
+import ffmpeg
+import pytest
+
+from artbox.pipeline import Pipeline, load_audio, save_audio, spectrogram
+
+TEST_DATA_DIR = Path(__file__).parent / "data"
+
+
+def test_pipeline(tmp_path):
+    """Test a pipeline that shares the decoded audio between stages."""
+    mp3_path = TEST_DATA_DIR / "audios" / "speech.mp3"
+    image_path = tmp_path / "spectrogram.png"
+    wav_path = tmp_path / "speech.wav"
+
+    pipeline = Pipeline()
+    pipeline.add("audio", load_audio(str(mp3_path), sample_rate=16000))
+    pipeline.add("image", spectrogram(str(image_path)), inputs=["audio"])
+    pipeline.add("wav", save_audio(str(wav_path)), inputs=["audio"])
+    pipeline.add("duration", lambda audio: audio.duration, inputs=["audio"])
+    outputs = pipeline.run()
+
+    assert outputs["audio"].sample_rate == 16000  # noqa: PLR2004
+    assert outputs["duration"] == pytest.approx(14.9, abs=0.1)
+    assert image_path.exists()
+
+    probe = ffmpeg.probe(str(wav_path))
+    assert probe["streams"][0]["sample_rate"] == "16000"
+
+
+def test_pipeline_unknown_input():
+    """Test that a stage can't depend on a missing stage."""
+    pipeline = Pipeline().add("text", lambda audio: None, inputs=["audio"])
+    with pytest.raises(Exception, match="unknown stage"):
+        pipeline.run()
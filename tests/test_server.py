@@ -0,0 +1,77 @@
+"""Set of tests for the server module."""
+
+import os
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+
+from artbox import __version__
+from artbox.server import dispatch
+
+TEST_DATA_DIR = Path(__file__).parent / "data"
+
+
+def test_serve_and_dispatch(tmp_path, capsys, monkeypatch):
+    """Test running commands on an artbox server."""
+    socket_path = tmp_path / "artbox.sock"
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "artbox",
+            "serve",
+            "--socket-path",
+            str(socket_path),
+        ]
+    )
+
+    try:
+        for _ in range(600):
+            if socket_path.exists():
+                break
+            time.sleep(0.1)
+        assert socket_path.exists()
+
+        assert dispatch(["--version"], str(socket_path)) == 0
+        assert __version__ in capsys.readouterr().out
+
+        output_path = tmp_path / "music.mp3"
+        argv = [
+            "sound",
+            "notes-to-audio",
+            "--input-path",
+            str(TEST_DATA_DIR / "notes" / "set1.txt"),
+            "--output-path",
+            output_path.name,
+            "--duration",
+            "2",
+        ]
+        # relative paths are resolved from the client directory
+        cwd = os.getcwd()
+        os.chdir(tmp_path)
+        try:
+            assert dispatch(argv, str(socket_path)) == 0
+        finally:
+            os.chdir(cwd)
+        assert output_path.exists()
+
+        # the command uses the environment of the client
+        cache_dir = tmp_path / "cache"
+        monkeypatch.setenv("ARTBOX_CACHE_DIR", str(cache_dir))
+        argv = [
+            "video",
+            "get-metadata",
+            "--input-path",
+            str(TEST_DATA_DIR / "audios" / "speech.mp3"),
+            "--output-path",
+            str(tmp_path / "speech.json"),
+        ]
+        assert dispatch(argv, str(socket_path)) == 0
+        assert len(list((cache_dir / "metadata").iterdir())) == 1
+
+        assert dispatch(["sound", "unknown"], str(socket_path)) != 0
+    finally:
+        server.terminate()
+        server.wait()
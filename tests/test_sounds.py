@@ -1,13 +1,29 @@
 """Set of tests for the sounds module."""
 
+import json
 import os
 import unittest
 
 from pathlib import Path
 
+import ffmpeg
+import numpy as np
 import pytest
 
-from artbox.sounds import Sound
+from artbox.sounds import (
+    NOTES_FREQ,
+    Sound,
+    frequencies_to_notes,
+    compute_features,
+    downsample_frames,
+    mel_filterbank,
+    mel_spectrogram_db,
+    power_spectrogram,
+    stream_mel_spectrogram,
+    notes_to_labels,
+    resolve_notes,
+    synthesize_notes,
+)
 
 TMP_PATH = Path("/tmp/artbox")
 TEST_DATA_DIR = Path(__file__).parent / "data"
@@ -15,6 +31,14 @@ TEST_DATA_DIR = Path(__file__).parent / "data"
 os.makedirs(TMP_PATH, exist_ok=True)
 
 
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path_factory, monkeypatch):
+    """Keep the decoded audio cache out of the home directory."""
+    path = tmp_path_factory.mktemp("cache")
+    monkeypatch.setenv("ARTBOX_CACHE_DIR", str(path))
+    return path
+
+
 def test_notes_to_audio():
     """Test the extraction of notes from mp3 file."""
     mp3_path = TMP_PATH / "set1.mp3"
@@ -29,19 +53,68 @@ def test_notes_to_audio():
     sound.notes_to_audio()
 
 
-@unittest.skip("not fully implemented")
+def test_synthesize_notes():
+    """Test the rendering of a note sequence into a single buffer."""
+    from pydub.generators import Sine
+
+    notes = ["E", "D", "E", "D", "E", "B", "D", "C", "A"]
+    frequencies = [NOTES_FREQ[note] for note in notes]
+    samples = synthesize_notes(frequencies, 100)
+
+    assert samples.dtype == np.int16
+    assert len(samples) == len(notes) * 4410
+
+    # the first note starts with phase zero, as pydub's Sine
+    expected = Sine(frequencies[0]).to_audio_segment(duration=100)
+    expected = np.array(expected.get_array_of_samples())
+    np.testing.assert_allclose(samples[:4410], expected, atol=2)
+
+    # the phase is continuous across the note boundaries
+    max_step = 2 * np.pi * max(frequencies) / 44100 * 32767
+    assert np.abs(np.diff(samples.astype(np.int32))).max() <= max_step + 2
+
+
 def test_extract_notes_from_mp3():
     """Test the extraction of notes from mp3 file."""
     filename = "pixabay-science"
-    mp3_path = TEST_DATA_DIR / "audio" / f"{filename}.mp3"
-    output_notes = TMP_PATH / "notes" / f"{filename}.txt"
+    mp3_path = TEST_DATA_DIR / "audios" / f"{filename}.mp3"
+    output_notes = TMP_PATH / f"{filename}-notes.txt"
     params = {
         "input-path": mp3_path,
         "output-path": output_notes,
     }
     sound = Sound(params)
     notes = sound.extract_notes_from_mp3()
-    print("Detected notes:", notes)
+
+    assert notes
+    with open(output_notes, "r") as f:
+        assert json.load(f) == notes
+
+
+def test_resolve_notes():
+    """Test the resolution of tokens into available notes."""
+    tokens = ["X", "E", "D#", "C#4", "C#9", "?", "A4", "", "Bb"]
+    expected = ["E", "D", "C#4", "C", "C", "A4", "A4", "B"]
+    assert resolve_notes(tokens) == expected
+    assert Sound({}).process_notes(tokens) == expected
+
+
+def test_frequencies_to_notes():
+    """Test the mapping from frequencies to notes."""
+    labels = ["C0", "A3", "C#4", "A4", "G#5", "B7", "C8"]
+    frequencies = np.array([NOTES_FREQ[label] for label in labels])
+
+    # small deviations still map to the nearest note
+    codes = frequencies_to_notes(frequencies * 1.01)
+    assert notes_to_labels(codes) == labels
+    assert notes_to_labels(frequencies_to_notes([5.0, 10000.0])) == [
+        "C0",
+        "C8",
+    ]
+
+    sound = Sound({})
+    assert sound.frequency_to_note(130.81) == "C3"
+    assert sound.frequency_to_note(880.0) == "A5"
 
 
 @unittest.skip("not fully implemented")
@@ -57,14 +130,324 @@ def test_generate_melody():
     sound.generate_melody()
 
 
-@unittest.skip("not fully implemented")
 def test_convert_to_8bit_audio():
     """Test the audio conversion to 8bits style."""
-    input_path = TEST_DATA_DIR / "audio" / "pixabay-science.mp3"
-    output_path = TMP_PATH / "sounds" / "tok8bits.mp3"
+    input_path = TEST_DATA_DIR / "audios" / "pixabay-science.mp3"
+    output_path = TMP_PATH / "pixabay-science-8bits.mp3"
     params = {
-        "input-path": mp3_path,
-        "output-path": output_notes,
+        "input-path": input_path,
+        "output-path": output_path,
     }
     sound = Sound(params)
     sound.convert_to_8bit_audio()
+
+    probe = ffmpeg.probe(str(output_path))
+    assert float(probe["format"]["duration"]) == pytest.approx(127.3, abs=0.2)
+
+
+def test_mel_spectrogram_db():
+    """Test the mel spectrogram against librosa, with a cached filterbank."""
+    import librosa
+
+    sr = 22050
+    y = np.sin(2 * np.pi * 440 * np.arange(sr) / sr).astype(np.float32)
+
+    mel_filterbank.cache_clear()
+    result = mel_spectrogram_db(y, sr)
+    mel_spectrogram_db(y, sr)
+    assert mel_filterbank.cache_info().misses == 1
+
+    expected = librosa.power_to_db(
+        librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128, fmax=8000),
+        ref=np.max,
+    )
+    np.testing.assert_allclose(result, expected, atol=1e-3)
+
+
+@pytest.mark.parametrize("plain", [False, True])
+def test_spectrogram(tmp_path, plain):
+    """Test the spectrogram image."""
+    from matplotlib.image import imread
+
+    output_path = tmp_path / "spectrogram.png"
+    params = {
+        "input-path": str(TEST_DATA_DIR / "audios" / "speech.mp3"),
+        "output-path": str(output_path),
+        "plain": plain,
+    }
+    Sound(params).spectrogram()
+
+    image = imread(output_path)
+    if plain:
+        # one pixel per mel band and frame
+        assert image.shape[0] == 128  # noqa: PLR2004
+    else:
+        assert image.shape[:2] == (400, 1000)
+
+
+def test_spectrogram_batch(tmp_path, cache_dir):
+    """Test the spectrograms of many files, in parallel processes."""
+    params = {
+        "input-path": str(TEST_DATA_DIR / "audios" / "*.mp3"),
+        "output-path": str(tmp_path),
+        "plain": True,
+        "workers": 2,
+    }
+    assert Sound(params).spectrogram_batch() == 2  # noqa: PLR2004
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "pixabay-science.png",
+        "speech.png",
+    ]
+    # each file is decoded once, so it isn't cached by default
+    assert not list(cache_dir.iterdir())
+
+
+def test_compute_features():
+    """Test the shape of each feature."""
+    sr = 22050
+    y = np.sin(2 * np.pi * 440 * np.arange(sr) / sr).astype(np.float32)
+    power = power_spectrogram(y, n_fft=1024, hop_length=256)
+
+    features = compute_features(
+        power, sr, ["mfcc", "chroma", "linear", "mel"], n_fft=1024, n_mels=64
+    )
+
+    n_frames = power.shape[1]
+    assert list(features) == ["mfcc", "chroma", "linear", "mel"]
+    assert features["mel"].shape == (64, n_frames)
+    assert features["linear"].shape == (513, n_frames)
+    assert features["chroma"].shape == (12, n_frames)
+    assert features["mfcc"].shape == (20, n_frames)
+    assert np.argmax(features["chroma"].mean(axis=1)) == 9  # A  # noqa: PLR2004
+
+    with pytest.raises(Exception, match="not supported"):
+        compute_features(power, sr, ["cqt"])
+
+
+@pytest.mark.parametrize(
+    "features_name,features,dtype,expected",
+    [
+        ("mel.npy", "mel", "float16", ["mel.npy"]),
+        ("out.npz", "mel,mfcc", "float32", ["out.npz"]),
+        ("out.npy", "mel,mfcc", "float32", ["out-mel.npy", "out-mfcc.npy"]),
+    ],
+)
+def test_spectrogram_features(
+    tmp_path, features_name, features, dtype, expected
+):
+    """Test the export of the raw features, without the image."""
+    params = {
+        "input-path": str(TEST_DATA_DIR / "audios" / "speech.mp3"),
+        "features-path": str(tmp_path / features_name),
+        "features": features,
+        "dtype": dtype,
+        "n-mels": 64,
+        "hop-length": 1024,
+    }
+    Sound(params).spectrogram()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == expected
+    if features_name.endswith(".npz"):
+        arrays = np.load(tmp_path / features_name)
+        assert arrays["mel"].shape[0] == 64  # noqa: PLR2004
+        assert arrays["mfcc"].shape[0] == 20  # noqa: PLR2004
+    else:
+        mel = np.load(tmp_path / expected[0], mmap_mode="r")
+        assert isinstance(mel, np.memmap)
+        assert mel.dtype == dtype
+        # 14.9s at 22050 Hz, with a hop of 1024 samples
+        assert mel.shape[0] == 64  # noqa: PLR2004
+        assert mel.shape[1] == pytest.approx(14.9 * 22050 / 1024, abs=2)
+
+
+def test_stream_mel_spectrogram(tmp_path, monkeypatch):
+    """Test that the streaming spectrogram matches the in-memory one."""
+    import librosa
+
+    from artbox.audio import decode_audio
+
+    monkeypatch.setattr("artbox.sounds.STREAM_BLOCK_FRAMES", 64)
+    mp3_path = str(TEST_DATA_DIR / "audios" / "speech.mp3")
+
+    result = stream_mel_spectrogram(mp3_path, str(tmp_path / "mel.npy"))
+
+    y = decode_audio(mp3_path, sample_rate=22050).to_mono()
+    expected = librosa.power_to_db(
+        mel_filterbank(22050, 2048, 128, 8000) @ power_spectrogram(y),
+        top_db=None,
+    )
+    assert isinstance(result, np.memmap)
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected, atol=1e-3)
+
+
+def test_downsample_frames():
+    """Test that groups of frames are reduced to their maximum."""
+    spectrogram = np.arange(20, dtype=np.float32).reshape(2, 10)
+
+    result, factor = downsample_frames(spectrogram, max_frames=4)
+
+    assert factor == 3  # noqa: PLR2004
+    np.testing.assert_array_equal(result, [[2, 5, 8, 9], [12, 15, 18, 19]])
+
+
+def test_spectrogram_streaming(tmp_path):
+    """Test the spectrogram image and features in streaming mode."""
+    params = {
+        "input-path": str(TEST_DATA_DIR / "audios" / "pixabay-science.mp3"),
+        "output-path": str(tmp_path / "spectrogram.png"),
+        "features-path": str(tmp_path / "mel.npy"),
+        "stream": True,
+        "max-frames": 500,
+        "plain": True,
+    }
+    Sound(params).spectrogram()
+
+    from matplotlib.image import imread
+
+    assert imread(tmp_path / "spectrogram.png").shape[:2] == (128, 499)
+    assert np.load(tmp_path / "mel.npy", mmap_mode="r").shape[1] == 5484  # noqa: PLR2004
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "mel.npy",
+        "spectrogram.png",
+    ]
+
+
+def test_spectrogram_streaming_image_only(tmp_path):
+    """Test that the temporary spectrogram file is removed."""
+    params = {
+        "input-path": str(TEST_DATA_DIR / "audios" / "speech.mp3"),
+        "output-path": str(tmp_path / "spectrogram.png"),
+        "stream": True,
+    }
+    Sound(params).spectrogram()
+
+    assert [p.name for p in tmp_path.iterdir()] == ["spectrogram.png"]
+
+
+def test_load_cached_audio(tmp_path, cache_dir, monkeypatch):
+    """Test that a file with the same content is decoded only once."""
+    import shutil
+
+    from artbox import audio as audio_module
+
+    mp3_path = TEST_DATA_DIR / "audios" / "speech.mp3"
+    copy_path = tmp_path / "copy.mp3"
+    shutil.copyfile(mp3_path, copy_path)
+
+    first = audio_module.load_cached_audio(str(mp3_path), 16000)
+    expected = audio_module.decode_audio(str(mp3_path), 16000)
+    np.testing.assert_array_equal(first.samples, expected.samples)
+    assert isinstance(first.samples, np.memmap)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the audio should come from the cache")
+
+    monkeypatch.setattr(audio_module, "iter_audio_blocks", fail)
+    second = audio_module.load_cached_audio(str(copy_path), 16000)
+
+    np.testing.assert_array_equal(second.samples, expected.samples)
+    assert len(list((cache_dir / "pcm").iterdir())) == 1
+
+
+def test_load_cached_audio_eviction(cache_dir):
+    """Test that the cache is kept under its maximum size."""
+    from artbox.audio import load_cached_audio
+
+    mp3_path = str(TEST_DATA_DIR / "audios" / "speech.mp3")
+    pcm_dir = cache_dir / "pcm"
+    load_cached_audio(mp3_path, 8000)
+    (entry,) = pcm_dir.iterdir()
+    size = entry.stat().st_size
+
+    # 16 kHz takes twice the space, so only the oldest entry is removed
+    load_cached_audio(mp3_path, 16000, max_bytes=2 * size + size // 2)
+    assert [p.name.split("-")[1] for p in pcm_dir.iterdir()] == ["16000"]
+
+    # the audio is still readable when its own entry is evicted
+    audio = load_cached_audio(mp3_path, 22050, max_bytes=0)
+    assert audio.duration == pytest.approx(14.9, abs=0.1)
+    assert not list(pcm_dir.iterdir())
+
+
+def test_sound_shared_audio_cache(tmp_path, cache_dir, monkeypatch):
+    """Test that several operations on a file share the decoded audio."""
+    from artbox import audio as audio_module
+
+    calls = []
+    iter_audio_blocks = audio_module.iter_audio_blocks
+
+    def counting_iter_audio_blocks(*args, **kwargs):
+        calls.append(args[0])
+        return iter_audio_blocks(*args, **kwargs)
+
+    monkeypatch.setattr(
+        audio_module, "iter_audio_blocks", counting_iter_audio_blocks
+    )
+    mp3_path = str(TEST_DATA_DIR / "audios" / "speech.mp3")
+
+    Sound(
+        {
+            "input-path": mp3_path,
+            "output-path": str(tmp_path / "spectrogram.png"),
+        }
+    ).spectrogram()
+    Sound(
+        {
+            "input-path": mp3_path,
+            "output-path": str(tmp_path / "spectrogram-stream.png"),
+            "stream": True,
+        }
+    ).spectrogram()
+
+    assert calls == [mp3_path]
+    assert len(list((cache_dir / "pcm").iterdir())) == 1
+
+
+def test_iter_cached_audio_blocks(cache_dir, monkeypatch):
+    """Test that the cache is filled while the blocks are processed."""
+    from artbox import audio as audio_module
+
+    mp3_path = str(TEST_DATA_DIR / "audios" / "speech.mp3")
+    pcm_dir = cache_dir / "pcm"
+    expected = audio_module.decode_audio(mp3_path, 16000).samples
+
+    # the entry is only added when all the blocks are consumed
+    blocks = audio_module.iter_cached_audio_blocks(mp3_path, 4096, 16000)
+    next(blocks)
+    blocks.close()
+    assert not list(pcm_dir.iterdir())
+
+    blocks = audio_module.iter_cached_audio_blocks(mp3_path, 4096, 16000)
+    np.testing.assert_array_equal(
+        np.concatenate([block.copy() for block in blocks]), expected
+    )
+    assert len(list(pcm_dir.iterdir())) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the audio should come from the cache")
+
+    monkeypatch.setattr(audio_module, "iter_audio_blocks", fail)
+    blocks = audio_module.iter_cached_audio_blocks(mp3_path, 4096, 16000)
+    np.testing.assert_array_equal(np.concatenate(list(blocks)), expected)
+
+
+def test_load_cached_audio_large_file(tmp_path, cache_dir, monkeypatch):
+    """Test that large files are keyed by their stat, without hashing."""
+    import shutil
+
+    from artbox import audio as audio_module
+
+    def fail(file_path):
+        raise AssertionError("large files shouldn't be hashed")
+
+    monkeypatch.setattr(audio_module, "PCM_CACHE_HASH_MAX_BYTES", 0)
+    monkeypatch.setattr(audio_module, "file_content_hash", fail)
+    mp3_path = TEST_DATA_DIR / "audios" / "speech.mp3"
+    copy_path = tmp_path / "copy.mp3"
+    shutil.copyfile(mp3_path, copy_path)
+
+    audio_module.load_cached_audio(str(mp3_path), 8000)
+    audio_module.load_cached_audio(str(copy_path), 8000)
+
+    assert len(list((cache_dir / "pcm").iterdir())) == 2  # noqa: PLR2004
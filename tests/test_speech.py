@@ -1,12 +1,32 @@
 """Set of tests for the voices module."""
 
+import asyncio
+import json
 import os
+import sys
+import types
 
 from pathlib import Path
+from typing import ClassVar
 
+import aiohttp
+import numpy as np
 import pytest
+import speech_recognition
 
-from artbox.speech import SpeechToText, SpeechFromText
+from artbox.audio import AudioBuffer, split_on_silence
+import artbox.speech
+
+from artbox.speech import (
+    TTS_RETRIES,
+    WordBoundaries,
+    ModelCache,
+    SpeechEngineMSEdgeTTS,
+    SpeechFromText,
+    SpeechToText,
+    model_cache,
+    split_text,
+)
 
 TMP_PATH = Path("/tmp/artbox")
 TEST_DATA_DIR = Path(__file__).parent / "data"
@@ -77,3 +97,544 @@ def test_convert_speech_to_text(engine) -> None:
     with open(output_path, "r") as f:
         result = f.read().lower()
     assert result == expected
+
+
+def test_convert_speech_to_text_in_memory(tmp_path, monkeypatch) -> None:
+    """Test that the audio is decoded in memory, without temporary files."""
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    mp3_path = input_dir / "speech.mp3"
+    mp3_path.write_bytes(
+        (TEST_DATA_DIR / "audios" / "speech.mp3").read_bytes()
+    )
+    input_dir.chmod(0o555)
+
+    received = []
+
+    def recognize(self, audio_data):
+        received.append(audio_data)
+        return "recognized text"
+
+    monkeypatch.setattr(SpeechToText, "recognize", recognize)
+
+    params = {
+        "input-path": str(mp3_path),
+        "output-path": str(tmp_path / "speech.txt"),
+    }
+    try:
+        SpeechToText(params).convert()
+    finally:
+        input_dir.chmod(0o755)
+
+    assert sorted(p.name for p in input_dir.iterdir()) == ["speech.mp3"]
+    assert received[0].sample_rate == 22050  # noqa: PLR2004
+    assert received[0].sample_width == 2  # noqa: PLR2004
+    assert (tmp_path / "speech.txt").read_text() == "recognized text"
+
+
+class FakeCommunicate:
+    """Local stand-in for `edge_tts.Communicate`."""
+
+    running = 0
+    max_running = 0
+    voices: ClassVar[list[str]] = []
+    failed: ClassVar[set[str]] = set()
+
+    def __init__(self, text, voice, *, rate, volume, pitch, boundary=None):
+        self.text = text
+        self.voice = voice
+        self.boundary = boundary
+
+    async def stream(self):
+        """Yield the text as audio, failing if it contains `fail`."""
+        cls = type(self)
+        cls.voices.append(self.voice)
+        cls.running += 1
+        cls.max_running = max(cls.max_running, cls.running)
+        try:
+            await asyncio.sleep(0.01)
+            if "flaky" in self.text and self.text not in cls.failed:
+                cls.failed.add(self.text)
+                raise aiohttp.ClientError("connection reset")
+            yield {"type": "audio", "data": self.text.encode()}
+            if self.boundary == "WordBoundary":
+                for i, word in enumerate(self.text.split()):
+                    yield {
+                        "type": "WordBoundary",
+                        "offset": i * 5_000_000,
+                        "duration": 4_000_000,
+                        "text": word,
+                    }
+            if "fail" in self.text:
+                raise Exception("connection lost")
+        finally:
+            cls.running -= 1
+
+
+class FakeVoicesManager:
+    """Local stand-in for `edge_tts.VoicesManager`."""
+
+    creates = 0
+
+    @classmethod
+    async def create(cls):
+        """Count the fetches of the voice list."""
+        cls.creates += 1
+        await asyncio.sleep(0.01)
+        return cls()
+
+    def find(self, **kwargs):
+        """Return ten voices."""
+        return [{"Name": f"en-US-Fake{i}Neural"} for i in range(10)]
+
+
+@pytest.fixture
+def fake_edge_tts(monkeypatch):
+    """Replace the edge-tts service by local stand-ins."""
+    monkeypatch.setattr(
+        SpeechEngineMSEdgeTTS, "communicate_class", FakeCommunicate
+    )
+    monkeypatch.setattr(artbox.speech, "_voices_manager", FakeVoicesManager())
+    FakeCommunicate.running = 0
+    FakeCommunicate.max_running = 0
+    FakeCommunicate.voices = []
+    FakeCommunicate.failed = set()
+    return FakeCommunicate
+
+
+def test_convert_from_text_batch(tmp_path, fake_edge_tts) -> None:
+    """Test the concurrent conversion of many text files."""
+    input_dir = tmp_path / "texts"
+    (input_dir / "part").mkdir(parents=True)
+    n_files = 20
+    for i in range(n_files):
+        (input_dir / "part" / f"text-{i}.txt").write_text(f"text {i}")
+
+    params = {
+        "input-path": str(input_dir),
+        "output-path": str(tmp_path / "audios"),
+        "engine": "edge-tts",
+        "concurrency": 4,
+    }
+    assert SpeechFromText(params).convert_batch() == n_files
+
+    for i in range(n_files):
+        output_path = tmp_path / "audios" / "part" / f"text-{i}.mp3"
+        assert output_path.read_text() == f"text {i}"
+    assert fake_edge_tts.max_running == 4  # noqa: PLR2004
+    assert fake_edge_tts.voices[0].startswith("en-US-Fake")
+
+
+def test_convert_from_text_batch_voices(
+    tmp_path, fake_edge_tts, monkeypatch
+) -> None:
+    """Test that the voice list is fetched once for many files."""
+    monkeypatch.setattr(artbox.speech, "_voices_manager", None)
+    monkeypatch.setattr(artbox.speech, "VoicesManager", FakeVoicesManager)
+    FakeVoicesManager.creates = 0
+    for i in range(5):
+        (tmp_path / f"{i}.txt").write_text(f"text {i}")
+
+    params = {
+        "input-path": str(tmp_path / "*.txt"),
+        "output-path": str(tmp_path / "audios"),
+    }
+    assert SpeechFromText(params).convert_batch() == 5  # noqa: PLR2004
+    assert FakeVoicesManager.creates == 1
+
+
+def test_convert_from_text_batch_errors(tmp_path, fake_edge_tts) -> None:
+    """Test that a failure doesn't stop the other files."""
+    for name in ("a", "fail", "b"):
+        (tmp_path / f"{name}.txt").write_text(name)
+
+    params = {
+        "input-path": str(tmp_path / "*.txt"),
+        "output-path": str(tmp_path / "audios"),
+        "voice": "en-GB-FakeNeural",
+        "cache-dir": str(tmp_path / "cache"),
+    }
+    with pytest.raises(Exception, match="1 of 3 texts failed"):
+        SpeechFromText(params).convert_batch()
+
+    assert (tmp_path / "audios" / "a.mp3").read_text() == "a"
+    assert (tmp_path / "audios" / "b.mp3").read_text() == "b"
+    assert set(fake_edge_tts.voices) == {"en-GB-FakeNeural"}
+
+
+def test_split_text() -> None:
+    """Test the split of a text at paragraphs and sentences."""
+    text = (
+        "First sentence here. Second one!  Third?\n\n"
+        "New paragraph, a bit longer than the others. Last."
+    )
+    assert split_text(text, 40) == [
+        "First sentence here. Second one! Third?",
+        "New paragraph, a bit longer than the",
+        "others. Last.",
+    ]
+    assert split_text(text, 1000) == [
+        "First sentence here. Second one! Third?\n\n"
+        "New paragraph, a bit longer than the others. Last."
+    ]
+
+
+def test_convert_long_text(tmp_path, monkeypatch, fake_edge_tts) -> None:
+    """Test the synthesis of a long text in parallel chunks."""
+    monkeypatch.setattr(artbox.speech, "TTS_RETRY_DELAY", 0)
+    sentences = [f"Sentence {i} is flaky." for i in range(10)]
+    input_path = tmp_path / "long.txt"
+    input_path.write_text(" ".join(sentences))
+
+    params = {
+        "title": "long",
+        "input-path": str(input_path),
+        "output-path": str(tmp_path / "long.mp3"),
+        "chunk-size": 50,
+        "concurrency": 3,
+    }
+    SpeechFromText(params).convert()
+
+    chunks = split_text(input_path.read_text(), 50)
+    assert len(chunks) == 5  # noqa: PLR2004
+    assert (tmp_path / "long.mp3").read_text() == "".join(chunks)
+    assert len(set(fake_edge_tts.voices)) == 1
+    assert fake_edge_tts.failed == set(chunks)
+    assert fake_edge_tts.max_running <= 3  # noqa: PLR2004
+
+
+def test_convert_long_text_retries(tmp_path, monkeypatch) -> None:
+    """Test that a chunk fails after the retries are exhausted."""
+    monkeypatch.setattr(artbox.speech, "TTS_RETRY_DELAY", 0)
+    attempts = []
+
+    async def synthesize_chunk(self, text, voice):
+        attempts.append(text)
+        raise aiohttp.ClientError("connection reset")
+
+    monkeypatch.setattr(
+        SpeechEngineMSEdgeTTS, "synthesize_chunk", synthesize_chunk
+    )
+    input_path = tmp_path / "long.txt"
+    input_path.write_text("A sentence.")
+    params = {
+        "title": "long",
+        "input-path": str(input_path),
+        "output-path": str(tmp_path / "long.mp3"),
+        "voice": "en-US-FakeNeural",
+        "chunk-size": 50,
+    }
+    with pytest.raises(aiohttp.ClientError):
+        SpeechFromText(params).convert()
+    assert len(attempts) == TTS_RETRIES + 1
+
+
+def test_convert_from_text_cache(tmp_path, fake_edge_tts) -> None:
+    """Test that repeated texts are served from the cache."""
+    params = {
+        "title": "cache",
+        "voice": "en-US-FakeNeural",
+        "cache-dir": str(tmp_path / "cache"),
+    }
+    texts = ["Hello,  world.\n", "Hello, world.", "Hello, world!"]
+    for i, text in enumerate(texts):
+        (tmp_path / f"{i}.txt").write_text(text)
+        params.update(
+            {
+                "input-path": str(tmp_path / f"{i}.txt"),
+                "output-path": str(tmp_path / f"{i}.mp3"),
+            }
+        )
+        SpeechFromText(params).convert()
+
+    # the second text is the same as the first one, once normalized
+    assert len(fake_edge_tts.voices) == 2  # noqa: PLR2004
+    assert (tmp_path / "1.mp3").read_text() == "Hello,  world.\n"
+    assert (tmp_path / "0.mp3").stat().st_ino == (
+        tmp_path / "1.mp3"
+    ).stat().st_ino
+    assert len(list((tmp_path / "cache" / "tts").iterdir())) == 2  # noqa: PLR2004
+
+    # a random voice is chosen for each call, so it isn't cached
+    del params["voice"]
+    SpeechFromText(params).convert()
+    assert len(fake_edge_tts.voices) == 3  # noqa: PLR2004
+
+
+def test_convert_from_text_cache_overwrite(tmp_path, fake_edge_tts) -> None:
+    """Test that overwriting an output doesn't modify the cached audio."""
+    params = {
+        "title": "cache",
+        "voice": "en-US-FakeNeural",
+        "output-path": str(tmp_path / "out.mp3"),
+        "cache-dir": str(tmp_path / "cache"),
+    }
+    for name in ("text A", "text B", "text A"):
+        (tmp_path / "input.txt").write_text(name)
+        params["input-path"] = str(tmp_path / "input.txt")
+        SpeechFromText(params).convert()
+        assert (tmp_path / "out.mp3").read_text() == name
+
+    assert len(fake_edge_tts.voices) == 2  # noqa: PLR2004
+    cached = sorted(
+        p.read_text() for p in (tmp_path / "cache" / "tts").iterdir()
+    )
+    assert cached == ["text A", "text B"]
+
+
+def test_word_boundaries_to_segments() -> None:
+    """Test the grouping of the words into subtitles."""
+    boundaries = WordBoundaries()
+    for i, word in enumerate(["one", "two", "three", "four"]):
+        boundaries.append(i * 10_000_000, 5_000_000, word)
+
+    assert boundaries.to_segments(max_chars=10) == [
+        (0.0, 1.5, "one two"),
+        (2.0, 3.5, "three four"),
+    ]
+
+
+def test_convert_from_text_timings(tmp_path, fake_edge_tts) -> None:
+    """Test the timings sidecar, and that nothing is printed."""
+    input_path = tmp_path / "text.txt"
+    input_path.write_text("Hello big world.")
+    params = {
+        "title": "timings",
+        "input-path": str(input_path),
+        "output-path": str(tmp_path / "text.mp3"),
+        "timings": "srt",
+        "no-cache": True,
+    }
+    SpeechFromText(params).convert()
+
+    assert (tmp_path / "text.srt").read_text() == (
+        "1\n00:00:00,000 --> 00:00:01,400\nHello big world.\n"
+    )
+
+
+class FakeCommunicate6(FakeCommunicate):
+    """Stand-in for edge-tts 6, which always sends the word boundaries."""
+
+    def __init__(self, text, voice, *, rate, volume, pitch):
+        super().__init__(
+            text,
+            voice,
+            rate=rate,
+            volume=volume,
+            pitch=pitch,
+            boundary="WordBoundary",
+        )
+
+
+def test_convert_from_text_timings_edge_tts_6(
+    tmp_path, fake_edge_tts, monkeypatch
+) -> None:
+    """Test the timings with edge-tts 6, without the `boundary` argument."""
+    monkeypatch.setattr(
+        SpeechEngineMSEdgeTTS, "communicate_class", FakeCommunicate6
+    )
+    input_path = tmp_path / "text.txt"
+    input_path.write_text("Hello big world.")
+    params = {
+        "title": "timings",
+        "input-path": str(input_path),
+        "output-path": str(tmp_path / "text.mp3"),
+        "timings": "srt",
+        "no-cache": True,
+    }
+    SpeechFromText(params).convert()
+
+    assert (tmp_path / "text.srt").read_text() == (
+        "1\n00:00:00,000 --> 00:00:01,400\nHello big world.\n"
+    )
+
+
+def test_convert_long_text_timings(tmp_path, fake_edge_tts) -> None:
+    """Test that the timings of the chunks are joined in order."""
+    input_path = tmp_path / "text.txt"
+    input_path.write_text("First one. Second one.")
+    params = {
+        "title": "timings",
+        "input-path": str(input_path),
+        "output-path": str(tmp_path / "text.mp3"),
+        "voice": "en-US-FakeNeural",
+        "timings": "json",
+        "chunk-size": 11,
+        "cache-dir": str(tmp_path / "cache"),
+    }
+    SpeechFromText(params).convert()
+
+    # the first chunk has 10 bytes of audio, at 48 kbps
+    shift = (10 * 8 * 10_000_000 // 48_000) / 10_000_000
+    timings = json.loads((tmp_path / "text.json").read_text())
+    assert [t["word"] for t in timings] == ["First", "one.", "Second", "one."]
+    assert [t["start"] for t in timings] == pytest.approx(
+        [0, 0.5, shift, shift + 0.5]
+    )
+
+    # the sidecar is cached with the audio
+    (tmp_path / "text.json").unlink()
+    SpeechFromText(params).convert()
+    assert json.loads((tmp_path / "text.json").read_text()) == timings
+    assert len(fake_edge_tts.voices) == 2  # noqa: PLR2004
+
+
+def _speech_with_pauses(sample_rate: int) -> np.ndarray:
+    """Return 3 tones of 1s separated by silences of 0.5s."""
+    t = np.arange(sample_rate) / sample_rate
+    tone = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    silence = np.zeros(sample_rate // 2, dtype=np.float32)
+    return np.concatenate([tone, silence, tone, silence, tone])
+
+
+def test_split_on_silence() -> None:
+    """Test that long audios are cut at the silences."""
+    sample_rate = 16000
+    samples = _speech_with_pauses(sample_rate)
+
+    spans = split_on_silence(samples, sample_rate, max_duration=2)
+
+    assert spans[0][0] == 0
+    assert spans[-1][1] == len(samples)
+    for i in range(1, len(spans)):
+        cut = spans[i][0]
+        assert spans[i - 1][1] == cut
+        assert not samples[cut - 100 : cut + 100].any()
+    for start, end in spans:
+        assert end - start <= 2 * sample_rate
+
+
+@pytest.mark.parametrize(
+    "suffix,expected",
+    [
+        (".txt", "chunk chunk chunk"),
+        (
+            ".srt",
+            "1\n00:00:00,000 --> 00:00:01,250\nchunk\n\n"
+            "2\n00:00:01,250 --> 00:00:02,750\nchunk\n\n"
+            "3\n00:00:02,750 --> 00:00:04,000\nchunk\n",
+        ),
+    ],
+)
+def test_convert_long_audio(tmp_path, monkeypatch, suffix, expected) -> None:
+    """Test the recognition of a long audio in parallel chunks."""
+    sample_rate = 16000
+
+    def recognize(self, audio_data, allow_empty=False):
+        assert allow_empty
+        assert len(audio_data.frame_data) <= 2 * 2 * sample_rate
+        return "chunk "
+
+    monkeypatch.setattr(SpeechToText, "recognize", recognize)
+
+    output_path = tmp_path / f"speech{suffix}"
+    params = {
+        "output-path": str(output_path),
+        "engine": "vosk",
+        "chunk-duration": 2,
+        "workers": 2,
+    }
+    audio = AudioBuffer(_speech_with_pauses(sample_rate), sample_rate)
+    segments = SpeechToText(params).convert_long_audio(audio)
+
+    assert len(segments) == 3  # noqa: PLR2004
+    assert output_path.read_text() == expected
+
+
+def test_model_cache() -> None:
+    """Test that the least recently used models are dropped."""
+    cache = ModelCache(max_bytes=10)
+    loads = []
+
+    def get(name: str, size: int) -> str:
+        def load() -> str:
+            loads.append(name)
+            return name
+
+        return cache.get(name, load, lambda _: size)
+
+    assert get("a", 4) == "a"
+    assert get("b", 4) == "b"
+    assert get("a", 4) == "a"
+    assert loads == ["a", "b"]
+
+    get("c", 4)  # over budget, drops "b"
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+
+    get("d", 20)  # bigger than the budget, but kept
+    assert "d" in cache
+    assert "a" not in cache
+
+
+class FakeWhisperModel:
+    """Stand-in for a Whisper model."""
+
+    device = types.SimpleNamespace(type="cpu")
+
+    def parameters(self):
+        """Return no parameters."""
+        return []
+
+    def transcribe(self, samples, *, language, fp16):
+        """Return the number of samples and the language."""
+        assert samples.dtype == np.float32
+        return {"text": f" {len(samples)} {language}"}
+
+
+class FakeVoskRecognizer:
+    """Stand-in for `vosk.KaldiRecognizer`."""
+
+    def __init__(self, model, sample_rate):
+        self.n_bytes = 0
+
+    def AcceptWaveform(self, data):
+        """Count the bytes of audio."""
+        self.n_bytes += len(data)
+
+    def FinalResult(self):
+        """Return the number of bytes of audio."""
+        return json.dumps({"text": str(self.n_bytes)})
+
+
+@pytest.mark.parametrize(
+    ("engine", "expected"), [("whisper", "1600 pt"), ("vosk", "3200")]
+)
+def test_recognize_reuses_model(
+    tmp_path, monkeypatch, engine, expected
+) -> None:
+    """Test that the local engines load their model once across calls."""
+    loads = []
+    whisper = types.SimpleNamespace(
+        load_model=lambda name: loads.append(name) or FakeWhisperModel()
+    )
+    vosk = types.SimpleNamespace(
+        Model=lambda path: loads.append(path) or object(),
+        KaldiRecognizer=FakeVoskRecognizer,
+    )
+    monkeypatch.setitem(sys.modules, "whisper", whisper)
+    monkeypatch.setitem(sys.modules, "vosk", vosk)
+    model_cache.clear()
+
+    model = "tiny" if engine == "whisper" else str(tmp_path)
+    audio_data = AudioBuffer(np.zeros(1600, dtype=np.float32), 16000)
+    params = {"engine": engine, "model": model, "lang": "pt-BR"}
+    for _ in range(3):
+        speech = SpeechToText(params)
+        text = speech.recognize(
+            speech_recognition.AudioData(
+                audio_data.to_int16().tobytes(), 16000, 2
+            )
+        )
+        assert text == expected
+
+    assert loads == [model]
+    model_cache.clear()
+
+
+def test_recognize_unknown_engine() -> None:
+    """Test that an unknown engine fails with a clear message."""
+    speech = SpeechToText({"engine": "unknown"})
+    with pytest.raises(Exception, match="not supported"):
+        speech.recognize(speech_recognition.AudioData(b"", 16000, 2))
@@ -1,12 +1,14 @@
 """Set of tests for the videos module."""
 
+import json
 import os
 
 from pathlib import Path
 
+import ffmpeg
 import pytest
 
-from artbox.videos import Video, Youtube
+from artbox.videos import Video, VideoMetadata, Youtube
 
 
 TMP_PATH = Path("/tmp/artbox")
@@ -15,22 +17,30 @@ TEST_DATA_DIR = Path(__file__).parent / "data"
 os.makedirs(TMP_PATH, exist_ok=True)
 
 
-def test_combine_video_and_audio():
+@pytest.mark.parametrize("reencode", [False, True])
+def test_combine_video_and_audio(reencode):
     """Test the function that combines video and audio."""
     # Example usage
     # "The Legend of Zelda Tears of the Kingdom - Official Trailer 3.mp4"
     video_path = TEST_DATA_DIR / "videos" / "pixabay-fuji.mp4"
     audio_path = TEST_DATA_DIR / "audios" / "pixabay-science.mp3"
-    output_path = TMP_PATH / "video+audio.mp4"
+    output_path = TMP_PATH / f"video+audio-{int(reencode)}.mp4"
 
     params = {
         "video-path": str(video_path),
         "audio-path": str(audio_path),
         "output-path": str(output_path),
+        "reencode": reencode,
     }
     video = Video(params)
     video.combine_video_and_audio()
 
+    probe = ffmpeg.probe(str(output_path))
+    codec_types = {stream["codec_type"] for stream in probe["streams"]}
+    assert codec_types == {"video", "audio"}
+    # the video is shorter than the audio
+    assert float(probe["format"]["duration"]) == pytest.approx(10.1, abs=0.2)
+
 
 def test_download_from_youtube():
     """Test the method that downloads videos from youtube."""
@@ -46,17 +56,109 @@ def test_download_from_youtube():
         youtube.download()
 
 
-def test_remove_audio():
+def _create_video_with_audio(output_path: Path) -> None:
+    """Create a video file with an AAC audio track."""
+    Video(
+        {
+            "video-path": str(TEST_DATA_DIR / "videos" / "pixabay-fuji.mp4"),
+            "audio-path": str(
+                TEST_DATA_DIR / "audios" / "pixabay-science.mp3"
+            ),
+            "output-path": str(output_path),
+        }
+    ).combine_video_and_audio()
+
+
+@pytest.mark.parametrize("codec", ["", "libx264"])
+def test_remove_audio(codec):
     """Test the function that removes audio from a video."""
-    input_file = TMP_PATH / (
-        "Princess Peachs Training Course in The Super Mario Bros Movie.mp4"
-    )
-    output_file = "peachs-no-audio.mp4"
+    input_path = TMP_PATH / "video+audio-0.mp4"
+    output_path = TMP_PATH / f"video-with-no-audio{codec}.mp4"
+    _create_video_with_audio(input_path)
 
     params = {
-        "input-path": TEST_DATA_DIR / "videos" / "pixabay-fuji.mp4",
-        "output-path": TMP_PATH / "video-with-no-audio.mp4",
+        "input-path": input_path,
+        "output-path": output_path,
+        "codec": codec,
     }
 
     video = Video(params)
     video.remove_audio()
+
+    probe = ffmpeg.probe(str(output_path))
+    assert [stream["codec_type"] for stream in probe["streams"]] == ["video"]
+
+
+@pytest.mark.parametrize(
+    "extension,bitrate,expected_codec",
+    [("m4a", "", "aac"), ("mp3", "", "mp3"), ("m4a", "64k", "aac")],
+)
+def test_extract_audio(extension, bitrate, expected_codec):
+    """Test the function that extracts the audio from a video."""
+    input_path = TMP_PATH / "video+audio-0.mp4"
+    output_path = TMP_PATH / f"extracted-audio{bitrate}.{extension}"
+    _create_video_with_audio(input_path)
+
+    params = {
+        "input-path": input_path,
+        "output-path": output_path,
+        "bitrate": bitrate,
+    }
+
+    video = Video(params)
+    video.extract_audio()
+
+    probe = ffmpeg.probe(str(output_path))
+    assert [stream["codec_name"] for stream in probe["streams"]] == [
+        expected_codec
+    ]
+    if bitrate:
+        assert int(probe["format"]["bit_rate"]) < 80_000
+
+
+def test_get_metadata(tmp_path, monkeypatch):
+    """Test the metadata extraction and its cache."""
+    params = {
+        "input-path": TEST_DATA_DIR / "videos" / "pixabay-fuji.mp4",
+        "output-path": tmp_path / "metadata.json",
+        "cache-dir": str(tmp_path / "cache"),
+    }
+
+    metadata = Video(params).get_metadata()
+    assert isinstance(metadata, VideoMetadata)
+    assert metadata.streams[0].type == "video"
+    assert metadata.streams[0].codec == "h264"
+
+    with open(params["output-path"], "r") as f:
+        assert VideoMetadata.from_dict(json.load(f)) == metadata
+
+    # the second probe is served by the cache
+    def fail_probe(*args, **kwargs):
+        raise AssertionError("ffprobe should not be called")
+
+    monkeypatch.setattr(ffmpeg, "probe", fail_probe)
+    assert Video(params).get_metadata() == metadata
+
+
+def test_get_metadata_batch(tmp_path):
+    """Test the metadata extraction of a directory."""
+    output_path = tmp_path / "metadata.jsonl"
+    params = {
+        "input-path": str(TEST_DATA_DIR),
+        "output-path": output_path,
+        "cache-dir": str(tmp_path / "cache"),
+        "workers": 2,
+    }
+
+    n_files = Video(params).get_metadata_batch()
+
+    with open(output_path, "r") as f:
+        results = {
+            Path(line["path"]).name: line for line in map(json.loads, f)
+        }
+
+    assert n_files == len(results)
+    assert results["pixabay-fuji.mp4"]["metadata"]["streams"][0]["codec"] == (
+        "h264"
+    )
+    assert "metadata" in results["speech.mp3"]